@@ -7,15 +7,31 @@ Herramienta de análisis multivariado para quimiometría
 from dotenv import load_dotenv
 load_dotenv()
 
+from typing import Any
+
+import orjson
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from app.routers import data, pca, clustering, classifier, similarity, report, assistant
 
+
+class ORJSONResponse(JSONResponse):
+    """
+    Respuesta JSON serializada con orjson: mucho más rápida que json estándar
+    para listas grandes de floats (scores, T², Q) y acepta arrays de numpy.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
 app = FastAPI(
     title="Chemometrics Helper API",
     description="API para análisis multivariado en quimiometría (PCA, Clustering, Clasificación, Similitud)",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Configurar CORS para permitir requests del frontend
@@ -68,7 +68,8 @@ class PreprocessingResponse(BaseModel):
 class PCARequest(BaseModel):
     """Request para análisis PCA"""
     session_id: str
-    n_componentes: Optional[int] = None  # None = todos los componentes
+    n_componentes: Optional[int] = None  # None = estimado automáticamente (~95% de varianza)
+    formato: str = Field(default="filas", description="'filas' (lista de diccionarios) o 'columnas' (un arreglo por componente)")
 
 
 class VarianzaComponente(BaseModel):
@@ -83,9 +84,14 @@ class PCAResponse(BaseModel):
     exito: bool
     mensaje: str
     n_componentes: int
+    formato: str = "filas"
     varianza_explicada: List[VarianzaComponente]
-    scores: List[Dict[str, float]]  # Lista de {PC1: valor, PC2: valor, ...}
-    loadings: List[Dict[str, Union[str, float]]]  # Lista por variable {variable: nombre, PC1: valor, ...}
+    # formato "filas": lista de {PC1: valor, PC2: valor, ...}
+    # formato "columnas": {PC1: [valores...], PC2: [valores...], ...}
+    scores: Union[List[Dict[str, float]], Dict[str, List[float]]]
+    # formato "filas": lista por variable {variable: nombre, PC1: valor, ...}
+    # formato "columnas": {variable: [nombres...], PC1: [valores...], ...}
+    loadings: Union[List[Dict[str, Union[str, float]]], Dict[str, List[Union[str, float]]]]
     nombres_muestras: List[int]
     nombres_variables: List[str]
     feedstock: Optional[List[int]] = None
@@ -406,6 +412,30 @@ class PCAContributionsResponse(BaseModel):
     interpretacion: str
 
 
+class PCAContributionsBatchRequest(BaseModel):
+    """Request para contribuciones de varias muestras"""
+    session_id: str
+    sample_indices: List[int] = Field(min_length=1, description="Índices de las muestras a analizar")
+    tipo_metrica: str = Field(default="T2", description="'T2' o 'Q'")
+
+
+class SampleContributions(BaseModel):
+    """Contribuciones por variable de una muestra"""
+    muestra: SampleInfo
+    tipo_metrica: str
+    contribuciones: List[VariableContribution]
+    top_5_variables: List[str]
+    interpretacion: str
+
+
+class PCAContributionsBatchResponse(BaseModel):
+    """Respuesta de contribuciones para varias muestras"""
+    exito: bool
+    mensaje: str
+    tipo_metrica: str
+    resultados: List[SampleContributions]
+
+
 # ============================================================================
 # SCHEMAS DE AUTO-OPTIMIZACIÓN DE PCs
 # ============================================================================
@@ -415,8 +445,8 @@ class PCOptimizationResult(BaseModel):
     k: int
     varianza_individual: float
     varianza_acumulada: float
-    error_reconstruccion: float
-    error_normalizado: float
+    error_reconstruccion: Optional[float] = None
+    error_normalizado: Optional[float] = None
 
 
 class OptimizationCriteria(BaseModel):
@@ -293,7 +293,7 @@ async def _execute_action(session_id: str, action_type: str, params: Dict[str, A
 
         # Primero obtener la recomendación de componentes
         try:
-            optim = calcular_optimizacion_pcs(session_id)
+            optim = calcular_optimizacion_pcs(session_id, incluir_errores=False)
             n_componentes = optim["componentes_recomendados"]
             varianza_objetivo = optim["varianza_recomendada"]
         except Exception:
@@ -302,7 +302,7 @@ async def _execute_action(session_id: str, action_type: str, params: Dict[str, A
             varianza_objetivo = 90.0
 
         # Calcular PCA
-        result = calcular_pca(session_id, n_componentes)
+        result = calcular_pca(session_id, n_componentes, formato="columnas")
 
         # varianza_explicada es una lista de dicts con keys: componente, varianza_explicada, varianza_acumulada
         # La varianza_acumulada del último componente es el total
@@ -323,7 +323,7 @@ async def _execute_action(session_id: str, action_type: str, params: Dict[str, A
         from app.services.pca_service import calcular_pca
 
         n_componentes = params.get("n_componentes", 5)
-        result = calcular_pca(session_id, n_componentes)
+        result = calcular_pca(session_id, n_componentes, formato="columnas")
 
         varianza_total = result["varianza_explicada"][-1]["varianza_acumulada"]
         return {
@@ -568,12 +568,12 @@ async def _execute_action(session_id: str, action_type: str, params: Dict[str, A
 
         # Paso 3: Calcular PCA óptimo
         try:
-            optim = calcular_optimizacion_pcs(session_id)
+            optim = calcular_optimizacion_pcs(session_id, incluir_errores=False)
             n_componentes = optim["componentes_recomendados"]
         except Exception:
             n_componentes = 5
 
-        result_pca = calcular_pca(session_id, n_componentes)
+        result_pca = calcular_pca(session_id, n_componentes, formato="columnas")
         varianza_total = result_pca["varianza_explicada"][-1]["varianza_acumulada"]
         steps_completed.append(f"PCA con {n_componentes} componentes ({varianza_total:.1f}% varianza)")
 
@@ -619,12 +619,12 @@ async def _execute_action(session_id: str, action_type: str, params: Dict[str, A
         # Paso 3: Calcular PCA si no está hecho
         if session.pca_scores is None:
             try:
-                optim = calcular_optimizacion_pcs(session_id)
+                optim = calcular_optimizacion_pcs(session_id, incluir_errores=False)
                 n_componentes = optim["componentes_recomendados"]
             except Exception:
                 n_componentes = 5
 
-            result_pca = calcular_pca(session_id, n_componentes)
+            result_pca = calcular_pca(session_id, n_componentes, formato="columnas")
             varianza_total = result_pca["varianza_explicada"][-1]["varianza_acumulada"]
             steps_completed.append(f"PCA con {n_componentes} componentes ({varianza_total:.1f}% varianza)")
 
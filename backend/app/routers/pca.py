@@ -9,13 +9,16 @@ from typing import Optional
 from app.models.schemas import (
     PCARequest, PCAResponse,
     PCADiagnosticsResponse, PCAContributionsRequest, PCAContributionsResponse,
+    PCAContributionsBatchRequest, PCAContributionsBatchResponse,
     PCAOptimizationResponse, PCA3DResponse, ChemicalMapRequest, ChemicalMapResponse
 )
 from app.services.store import store
 from app.services.pca_service import (
     calcular_pca,
+    serializar_scores_loadings,
     calcular_diagnosticos_pca,
     calcular_contribuciones_muestra,
+    calcular_contribuciones_batch,
     calcular_optimizacion_pcs,
     obtener_proyeccion_3d,
     obtener_mapa_quimico
@@ -31,7 +34,9 @@ async def ejecutar_pca(request: PCARequest):
 
     Parámetros:
     - session_id: ID de la sesión con datos preprocesados
-    - n_componentes: Número de componentes a calcular (opcional, por defecto todos)
+    - n_componentes: Número de componentes a calcular (opcional, por defecto se estima
+      el mínimo que explica ~95% de la varianza, con al menos 3 para la proyección 3D)
+    - formato: "filas" (lista de diccionarios, por defecto) o "columnas" (un arreglo por componente)
 
     Retorna:
     - Varianza explicada por componente
@@ -51,7 +56,8 @@ async def ejecutar_pca(request: PCARequest):
     try:
         resultado = calcular_pca(
             session_id=request.session_id,
-            n_componentes=request.n_componentes
+            n_componentes=request.n_componentes,
+            formato=request.formato
         )
 
         return PCAResponse(
@@ -60,12 +66,17 @@ async def ejecutar_pca(request: PCARequest):
             **resultado
         )
 
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/resultados/{session_id}")
-async def obtener_resultados_pca(session_id: str):
+async def obtener_resultados_pca(
+    session_id: str,
+    formato: str = Query("filas", description="'filas' o 'columnas'")
+):
     """
     Obtiene los resultados de PCA de una sesión sin recalcular.
     """
@@ -90,27 +101,25 @@ async def obtener_resultados_pca(session_id: str):
             "varianza_acumulada": float(varianza_acum)
         })
 
-    scores_list = []
-    for i in range(session.pca_scores.shape[0]):
-        score_dict = {}
-        for j, nombre in enumerate(session.pca_componentes_nombres):
-            score_dict[nombre] = float(session.pca_scores[i, j])
-        scores_list.append(score_dict)
-
-    loadings_list = []
-    for i, var in enumerate(session.columnas_seleccionadas):
-        loading_dict = {"variable": var}
-        for j, nombre in enumerate(session.pca_componentes_nombres):
-            loading_dict[nombre] = float(session.pca_loadings[i, j])
-        loadings_list.append(loading_dict)
+    try:
+        scores_out, loadings_out = serializar_scores_loadings(
+            session.pca_scores,
+            session.pca_loadings,
+            session.pca_componentes_nombres,
+            session.columnas_seleccionadas,
+            formato
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     return {
         "exito": True,
         "mensaje": "Resultados de PCA recuperados",
         "n_componentes": len(session.pca_componentes_nombres),
+        "formato": formato,
         "varianza_explicada": varianza_info,
-        "scores": scores_list,
-        "loadings": loadings_list,
+        "scores": scores_out,
+        "loadings": loadings_out,
         "nombres_muestras": list(range(len(session.pca_scores))),
         "nombres_variables": session.columnas_seleccionadas,
         "feedstock": session.feedstock.tolist() if session.feedstock is not None else None,
@@ -185,15 +194,54 @@ async def obtener_contribuciones(request: PCAContributionsRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/contribuciones-batch", response_model=PCAContributionsBatchResponse)
+async def obtener_contribuciones_batch(request: PCAContributionsBatchRequest):
+    """
+    Calcula las contribuciones de cada variable a T² o Q para varias muestras
+    en una sola petición (por ejemplo, todos los outliers combinados).
+
+    Parámetros:
+    - session_id: ID de la sesión
+    - sample_indices: Índices de las muestras a analizar
+    - tipo_metrica: "T2" (Hotelling) o "Q" (residual)
+    """
+    if not store.sesion_existe(request.session_id):
+        raise HTTPException(status_code=404, detail="Sesión no encontrada")
+
+    try:
+        resultado = calcular_contribuciones_batch(
+            session_id=request.session_id,
+            sample_indices=request.sample_indices,
+            tipo_metrica=request.tipo_metrica
+        )
+        return PCAContributionsBatchResponse(
+            exito=True,
+            mensaje=f"Contribuciones calculadas para {len(resultado['resultados'])} muestras",
+            **resultado
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # =============================================================================
 # AUTO-OPTIMIZACIÓN DEL NÚMERO DE COMPONENTES
 # =============================================================================
 
-@router.get("/optimizacion/{session_id}", response_model=PCAOptimizationResponse)
+# Sin errores de reconstrucción (incluir_errores=False) esos campos se omiten
+# de cada resultado en lugar de enviarse como null
+@router.get(
+    "/optimizacion/{session_id}",
+    response_model=PCAOptimizationResponse,
+    response_model_exclude_none=True
+)
 async def obtener_optimizacion_pcs(
     session_id: str,
     k_max: Optional[int] = Query(None, description="Máximo número de PCs a evaluar"),
-    umbral_varianza: float = Query(0.90, description="Umbral de varianza para recomendación (0-1)")
+    umbral_varianza: float = Query(0.90, description="Umbral de varianza para recomendación (0-1)"),
+    incremental: Optional[bool] = Query(None, description="Ajuste por lotes con IncrementalPCA (por defecto según tamaño)"),
+    incluir_errores: bool = Query(True, description="Incluir el error de reconstrucción por k (False = solo recomendación)")
 ):
     """
     Analiza diferentes números de componentes principales y recomienda el óptimo.
@@ -219,7 +267,9 @@ async def obtener_optimizacion_pcs(
         resultado = calcular_optimizacion_pcs(
             session_id=session_id,
             k_max=k_max,
-            umbral_varianza=umbral_varianza
+            umbral_varianza=umbral_varianza,
+            incremental=incremental,
+            incluir_errores=incluir_errores
         )
         return PCAOptimizationResponse(
             exito=True,
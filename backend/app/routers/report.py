@@ -3,14 +3,21 @@ Router para Generación de Reportes
 Endpoints para resúmenes y exportación a PDF
 """
 
+import tempfile
+
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 
 from app.models.schemas import ReportSummaryResponse
 from app.services import report_service
 
 router = APIRouter()
 
+# Tamaño a partir del cual el PDF en generación se vuelca a disco
+PDF_SPOOL_MAX_BYTES = 1024 * 1024
+PDF_CHUNK_BYTES = 64 * 1024
+
 
 @router.get("/summary/{session_id}", response_model=ReportSummaryResponse)
 async def obtener_resumen(session_id: str):
@@ -62,25 +69,33 @@ async def descargar_pdf(session_id: str):
     - Resultados de clasificadores
     - Interpretaciones y conclusiones
     """
+    destino = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_BYTES)
     try:
-        pdf_bytes = report_service.generar_pdf(session_id)
+        # El PDF se escribe en el archivo temporal y se envía por bloques,
+        # sin mantener una copia adicional de todos los bytes en memoria
+        report_service.generar_pdf(session_id, output=destino)
+        destino.seek(0)
 
-        return Response(
-            content=pdf_bytes,
+        return StreamingResponse(
+            iter(lambda: destino.read(PDF_CHUNK_BYTES), b""),
             media_type="application/pdf",
             headers={
                 "Content-Disposition": f"attachment; filename=reporte_quimiometrico_{session_id}.pdf"
-            }
+            },
+            background=BackgroundTask(destino.close)
         )
 
     except ImportError as e:
+        destino.close()
         raise HTTPException(
             status_code=500,
             detail="ReportLab no está instalado. Ejecuta: pip install reportlab"
         )
     except ValueError as e:
+        destino.close()
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
+        destino.close()
         raise HTTPException(status_code=500, detail=f"Error al generar PDF: {str(e)}")
 
 
@@ -4,6 +4,7 @@ Permite entrenar y usar modelos para predecir feedstock y concentration
 """
 
 import numpy as np
+import pandas as pd
 from typing import Dict, Any, Optional, List, Tuple
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.linear_model import LogisticRegression
@@ -38,6 +39,23 @@ CONCENTRATION_LABELS = {
     7: "Desconocida"
 }
 
+# A partir de este tamaño se cuentan las clases por hash (O(N)) en vez de ordenar
+UMBRAL_CONTEO_HASH = 50_000
+
+
+def _conteo_clases(y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Clases únicas (ordenadas) y su número de muestras.
+
+    Para pocos datos np.unique tiene menor coste fijo; para N grande evita
+    ordenar todo el array usando el conteo por hash de pandas.
+    """
+    if y.size <= UMBRAL_CONTEO_HASH:
+        return np.unique(y, return_counts=True)
+
+    vc = pd.Series(y).value_counts(sort=False).sort_index()
+    return vc.index.to_numpy(), vc.to_numpy()
+
 
 def obtener_labels_map(target: str) -> Dict[int, str]:
     """Obtiene el mapeo de etiquetas según el target"""
@@ -189,14 +207,14 @@ def entrenar_clasificador(
     X, y, feature_names = obtener_datos_para_clasificacion(session_id, target, usar_pca)
 
     # Filtrar clases con muy pocas muestras
-    unique, counts = np.unique(y, return_counts=True)
+    unique, counts = _conteo_clases(y)
     min_samples = 2
     valid_classes = unique[counts >= min_samples]
     mask = np.isin(y, valid_classes)
     X_filtered = X[mask]
     y_filtered = y[mask]
 
-    if len(np.unique(y_filtered)) < 2:
+    if len(valid_classes) < 2:
         raise ValueError("No hay suficientes clases con muestras para entrenar.")
 
     # Dividir datos
@@ -214,11 +232,12 @@ def entrenar_clasificador(
     # Predecir
     y_pred = modelo.predict(X_test)
 
-    # Calcular métricas
-    accuracy = accuracy_score(y_test, y_pred)
-    f1 = f1_score(y_test, y_pred, average='macro', zero_division=0)
-    precision = precision_score(y_test, y_pred, average='macro', zero_division=0)
-    recall = recall_score(y_test, y_pred, average='macro', zero_division=0)
+    # Calcular métricas (como float de Python: se guardan en la sesión y los
+    # reportes las leen sin conversiones)
+    accuracy = float(accuracy_score(y_test, y_pred))
+    f1 = float(f1_score(y_test, y_pred, average='macro', zero_division=0))
+    precision = float(precision_score(y_test, y_pred, average='macro', zero_division=0))
+    recall = float(recall_score(y_test, y_pred, average='macro', zero_division=0))
     conf_matrix = confusion_matrix(y_test, y_pred)
 
     # Obtener importancias
@@ -247,14 +266,15 @@ def entrenar_clasificador(
         session.classifier_feedstock = classifier_data
     else:
         session.classifier_concentration = classifier_data
+    session.version_analisis += 1
 
     return {
         "target": target,
         "modelo": modelo_tipo,
-        "accuracy": float(accuracy),
-        "f1_score": float(f1),
-        "precision": float(precision),
-        "recall": float(recall),
+        "accuracy": accuracy,
+        "f1_score": f1,
+        "precision": precision,
+        "recall": recall,
         "confusion_matrix": conf_matrix.tolist(),
         "class_labels": class_labels,
         "feature_importances": feature_importances,
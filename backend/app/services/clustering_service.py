@@ -48,6 +48,7 @@ def calcular_kmeans(
     # Guardar etiquetas en sesión
     session.cluster_labels = labels
     session.cluster_metodo = "kmeans"
+    session.version_analisis += 1
 
     # Calcular estadísticas por clúster
     estadisticas = calcular_estadisticas_clusters(session, labels, usar_pca)
@@ -103,6 +104,7 @@ def calcular_jerarquico(
     # Guardar etiquetas en sesión
     session.cluster_labels = labels
     session.cluster_metodo = "jerarquico"
+    session.version_analisis += 1
 
     # Calcular dendrograma
     dendro_data = calcular_dendrograma(X, linkage_method)
@@ -159,23 +161,28 @@ def calcular_estadisticas_clusters(
         X = session.X_procesado
         columnas = session.columnas_seleccionadas
 
-    for cluster_id in sorted(np.unique(labels)):
-        mask = labels == cluster_id
-        X_cluster = X[mask]
-
-        tamano = int(np.sum(mask))
+    # Ordenar las muestras por clúster una sola vez: cada clúster queda como
+    # un tramo contiguo y las medias salen de un único reduceat, sin una
+    # máscara booleana de longitud N por clúster
+    labels = np.asarray(labels, dtype=np.intp)
+    conteos = np.bincount(labels)
+    clusters = np.flatnonzero(conteos)
+    tamanos = conteos[clusters]
+    orden = np.argsort(labels, kind='stable')
+    inicios = (np.cumsum(conteos) - conteos)[clusters]
+    sumas = np.add.reduceat(X[orden], inicios, axis=0, dtype=np.float64)
+    medias_por_cluster = sumas / tamanos[:, None]
+
+    for cluster_id, tamano, medias_fila in zip(
+        clusters.tolist(), tamanos.tolist(), medias_por_cluster.tolist()
+    ):
         porcentaje = (tamano / n_total) * 100
 
-        # Calcular medias por variable/componente
-        medias = {}
-        for i, col in enumerate(columnas):
-            medias[col] = float(np.mean(X_cluster[:, i]))
-
         estadisticas.append({
-            "cluster_id": int(cluster_id),
+            "cluster_id": cluster_id,
             "tamano": tamano,
-            "porcentaje": float(porcentaje),
-            "medias": medias
+            "porcentaje": porcentaje,
+            "medias": dict(zip(columnas, medias_fila))
         })
 
     return estadisticas
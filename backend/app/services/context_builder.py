@@ -38,7 +38,7 @@ def _get_optimization_context(session_id: str) -> str:
     """
     try:
         from app.services.pca_service import calcular_optimizacion_pcs
-        optim = calcular_optimizacion_pcs(session_id)
+        optim = calcular_optimizacion_pcs(session_id, incluir_errores=False)
 
         context = f"""
 ### Recomendación de Número de Componentes
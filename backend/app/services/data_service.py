@@ -97,6 +97,19 @@ def cargar_ejemplo() -> Tuple[pd.DataFrame, str]:
         raise ValueError(f"Error al cargar archivo de ejemplo: {str(e)}")
 
 
+def codigos_categoricos(serie: pd.Series) -> np.ndarray:
+    """
+    Convierte una columna de códigos (feedstock, concentration) a enteros.
+    Usa int8 cuando todos los códigos caben (el caso habitual, 1-7): 8 veces
+    más denso que int64 para los conteos por grupo.
+    """
+    codigos = serie.values.astype(int)
+    info = np.iinfo(np.int8)
+    if codigos.size and info.min <= codigos.min() and codigos.max() <= info.max:
+        return codigos.astype(np.int8)
+    return codigos
+
+
 def procesar_dataframe(df: pd.DataFrame, session_id: str) -> Dict[str, Any]:
     """
     Procesa un DataFrame cargado y almacena en la sesión.
@@ -112,14 +125,21 @@ def procesar_dataframe(df: pd.DataFrame, session_id: str) -> Dict[str, Any]:
     # ==========================================================================
     # Limpiar datos preprocesados
     session.df_preprocesado = None
-    session.X_procesado = None
+    store.liberar_matriz_procesada(session)
     session.columnas_seleccionadas = []
 
     # Limpiar resultados de PCA
     session.pca_scores = None
     session.pca_loadings = None
     session.pca_varianza = None
+    session.pca_varianza_pct = None
+    session.pca_var_acumulada = None
+    session.pcs_80 = None
     session.pca_componentes_nombres = []
+    session.pca_X_origen = None
+    session.diagnosticos_cache = None
+    session.embeddings_cache = {}
+    session.distancias_cache = {}
 
     # Limpiar resultados de clustering
     session.cluster_labels = None
@@ -129,6 +149,8 @@ def procesar_dataframe(df: pd.DataFrame, session_id: str) -> Dict[str, Any]:
     session.classifier_feedstock = None
     session.classifier_concentration = None
 
+    session.version_analisis += 1
+
     # ==========================================================================
     # PROCESAR NUEVOS DATOS
     # ==========================================================================
@@ -170,9 +192,9 @@ def procesar_dataframe(df: pd.DataFrame, session_id: str) -> Dict[str, Any]:
     for col in df.columns:
         col_lower = col.lower()
         if col_lower == 'feedstock':
-            session.feedstock = df[col].values.astype(int) if not df[col].isna().all() else None
+            session.feedstock = codigos_categoricos(df[col]) if not df[col].isna().all() else None
         elif col_lower == 'concentration':
-            session.concentration = df[col].values.astype(int) if not df[col].isna().all() else None
+            session.concentration = codigos_categoricos(df[col]) if not df[col].isna().all() else None
 
     # Preparar muestra de datos
     muestra = df.head(10).fillna("").to_dict(orient='records')
@@ -260,9 +282,21 @@ def preprocesar_datos(
         scaler = StandardScaler()
         X_array = scaler.fit_transform(X_array)
 
-    # Guardar datos procesados
-    session.X_procesado = X_array
-    session.df_preprocesado = pd.DataFrame(X_array, columns=X.columns)
+    # Los embeddings cacheados corresponden a la matriz anterior; la nueva
+    # puede mapearse en la misma dirección y con la misma forma
+    session.embeddings_cache = {}
+    # Soltar también las referencias al memmap anterior antes de borrar su
+    # archivo (en Windows no se puede borrar mientras siga mapeado)
+    session.df_preprocesado = None
+    session.pca_X_origen = None
+    session.diagnosticos_cache = None
+    session.distancias_cache = {}
+    session.distancias_buf = None
+
+    # Guardar datos procesados (float32 en disco, mapeados en memoria)
+    X_procesado = store.guardar_matriz_procesada(session_id, X_array)
+    session.df_preprocesado = pd.DataFrame(X_procesado, columns=X.columns)
+    session.version_analisis += 1
 
     return {
         "num_filas": filas_finales,
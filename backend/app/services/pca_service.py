@@ -4,20 +4,127 @@ Incluye diagnósticos avanzados: Hotelling T², Q-residuals, contribuciones y au
 """
 
 import numpy as np
+from functools import lru_cache
 from typing import Dict, Any, Optional, List, Tuple
-from sklearn.decomposition import PCA
+from sklearn.decomposition import PCA, IncrementalPCA
+from sklearn.utils import gen_batches
+from sklearn.utils.extmath import randomized_svd
 from scipy import stats
+from scipy.linalg.blas import sgemm, dgemm
 
 from app.services.store import store
 
+# Intentar importar numba (opcional) para compilar el cálculo del codo
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
 
-def calcular_pca(session_id: str, n_componentes: Optional[int] = None) -> Dict[str, Any]:
+
+FORMATOS_RESULTADO = ("filas", "columnas")
+
+
+def _validar_formato(formato: str) -> None:
+    """Verifica que el formato de salida de scores/loadings sea soportado."""
+    if formato not in FORMATOS_RESULTADO:
+        raise ValueError(f"Formato '{formato}' no soportado. Use 'filas' o 'columnas'.")
+
+
+def serializar_scores_loadings(
+    scores: np.ndarray,
+    loadings: np.ndarray,
+    componentes_nombres: List[str],
+    variables: List[str],
+    formato: str = "filas"
+) -> Tuple[Any, Any]:
+    """
+    Convierte scores y loadings a estructuras JSON.
+
+    Args:
+        scores: Matriz de scores (n_samples x n_components)
+        loadings: Matriz de loadings (n_features x n_components)
+        componentes_nombres: Nombres de los componentes (PC1, PC2, ...)
+        variables: Nombres de las variables
+        formato: "filas" (lista de diccionarios) o "columnas" (un arreglo por componente)
+
+    Returns:
+        Tupla (scores, loadings) en el formato solicitado
+    """
+    _validar_formato(formato)
+
+    # Una sola conversión por columna; no se repiten las claves por muestra
+    scores_cols = {nombre: scores[:, j].tolist() for j, nombre in enumerate(componentes_nombres)}
+    loadings_cols = {nombre: loadings[:, j].tolist() for j, nombre in enumerate(componentes_nombres)}
+
+    if formato == "columnas":
+        return scores_cols, {"variable": list(variables), **loadings_cols}
+
+    # Scores como lista de diccionarios
+    scores_list = [
+        dict(zip(componentes_nombres, fila))
+        for fila in zip(*scores_cols.values())
+    ]
+
+    # Loadings como lista de diccionarios (una entrada por variable)
+    loadings_list = [
+        {"variable": var, **dict(zip(componentes_nombres, fila))}
+        for var, fila in zip(variables, zip(*loadings_cols.values()))
+    ]
+
+    return scores_list, loadings_list
+
+
+def estimar_n_componentes(
+    X: np.ndarray,
+    umbral_varianza: float = 0.95,
+    max_estimacion: int = 30
+) -> int:
+    """
+    Estima cuántos componentes retener sin calcular un PCA de rango completo.
+
+    Usa un SVD aleatorizado truncado (pocas iteraciones) para aproximar los
+    primeros valores singulares y toma el primer k cuya varianza acumulada
+    alcanza el umbral. La varianza total se obtiene directamente de los datos
+    centrados, por lo que no hace falta conocer los valores singulares restantes.
+
+    Args:
+        X: Datos preprocesados (n_samples x n_features)
+        umbral_varianza: Varianza acumulada objetivo (default 0.95)
+        max_estimacion: Máximo número de valores singulares a estimar
+
+    Returns:
+        Número de componentes recomendado (mínimo 3 si los datos lo permiten,
+        para que la proyección 3D funcione con el PCA por defecto)
+    """
+    max_componentes = min(X.shape[0], X.shape[1])
+    k_estimacion = min(max_estimacion, max_componentes)
+
+    X_centrado = X - X.mean(axis=0)
+    # Acumulada en float64: con X float32 y N grande la suma pierde precisión
+    varianza_total = np.einsum('ij,ij->', X_centrado, X_centrado, dtype=np.float64)
+    if varianza_total <= 1e-12:
+        return min(3, max_componentes)
+
+    _, s, _ = randomized_svd(X_centrado, n_components=k_estimacion, n_iter=2, random_state=42)
+    varianza_acumulada = np.cumsum(s.astype(np.float64) ** 2) / varianza_total
+
+    k = int(np.searchsorted(varianza_acumulada, umbral_varianza)) + 1
+    return min(max(3, k), max_componentes)
+
+
+def calcular_pca(
+    session_id: str,
+    n_componentes: Optional[int] = None,
+    formato: str = "filas"
+) -> Dict[str, Any]:
     """
     Realiza análisis PCA sobre los datos preprocesados.
 
     Args:
         session_id: ID de la sesión
-        n_componentes: Número de componentes a calcular (None = todos)
+        n_componentes: Número de componentes a calcular (None = estimado para ~95% de varianza)
+        formato: "filas" (lista de diccionarios) o "columnas" (un arreglo por componente)
 
     Returns:
         Diccionario con resultados del PCA
@@ -29,11 +136,16 @@ def calcular_pca(session_id: str, n_componentes: Optional[int] = None) -> Dict[s
     if session.X_procesado is None:
         raise ValueError("No hay datos preprocesados. Por favor, aplica preprocesamiento primero.")
 
+    _validar_formato(formato)
+
     X = session.X_procesado
 
     # Determinar número de componentes
     max_componentes = min(X.shape[0], X.shape[1])
-    if n_componentes is None or n_componentes > max_componentes:
+    if n_componentes is None:
+        # Evitar un PCA de rango completo cuando solo unos pocos PCs son relevantes
+        n_componentes = estimar_n_componentes(X)
+    elif n_componentes > max_componentes:
         n_componentes = max_componentes
 
     # Realizar PCA
@@ -48,11 +160,18 @@ def calcular_pca(session_id: str, n_componentes: Optional[int] = None) -> Dict[s
     # Nombres de componentes
     componentes_nombres = [f"PC{i+1}" for i in range(n_componentes)]
 
-    # Guardar en sesión
-    session.pca_scores = scores
+    # Guardar en sesión. Los scores se fijan en float32 como X_procesado
+    # (sklearn ya conserva el tipo de entrada, así que no suele haber copia):
+    # los kernels de similitud y diagnóstico leen la mitad de bytes
+    session.pca_scores = scores.astype(np.float32, copy=False)
     session.pca_loadings = loadings
     session.pca_varianza = varianza_explicada
+    session.pca_varianza_pct = varianza_explicada * 100.0
+    session.pca_var_acumulada = np.cumsum(session.pca_varianza_pct)
+    session.pcs_80 = int(np.searchsorted(session.pca_var_acumulada, 80)) + 1
     session.pca_componentes_nombres = componentes_nombres
+    session.pca_X_origen = X
+    session.version_analisis += 1
 
     # Preparar respuesta
     varianza_info = []
@@ -63,28 +182,17 @@ def calcular_pca(session_id: str, n_componentes: Optional[int] = None) -> Dict[s
             "varianza_acumulada": float(varianza_acumulada[i] * 100)
         })
 
-    # Scores como lista de diccionarios
-    scores_list = []
-    for i in range(scores.shape[0]):
-        score_dict = {}
-        for j, nombre in enumerate(componentes_nombres):
-            score_dict[nombre] = float(scores[i, j])
-        scores_list.append(score_dict)
-
-    # Loadings como lista de diccionarios (una entrada por variable)
-    loadings_list = []
     variables = session.columnas_seleccionadas
-    for i, var in enumerate(variables):
-        loading_dict = {"variable": var}
-        for j, nombre in enumerate(componentes_nombres):
-            loading_dict[nombre] = float(loadings[i, j])
-        loadings_list.append(loading_dict)
+    scores_out, loadings_out = serializar_scores_loadings(
+        scores, loadings, componentes_nombres, variables, formato
+    )
 
     return {
         "n_componentes": n_componentes,
+        "formato": formato,
         "varianza_explicada": varianza_info,
-        "scores": scores_list,
-        "loadings": loadings_list,
+        "scores": scores_out,
+        "loadings": loadings_out,
         "nombres_muestras": list(range(len(scores))),
         "nombres_variables": variables,
         "feedstock": session.feedstock.tolist() if session.feedstock is not None else None,
@@ -117,10 +225,37 @@ def obtener_scores_para_cluster(session_id: str, usar_pca: bool = True) -> np.nd
         return session.X_procesado
 
 
+def _pca_aleatorizado(n_componentes: int) -> PCA:
+    """
+    PCA con SVD aleatorizado: para espectros anchos (muchas variables y pocos
+    componentes) evita el SVD completo de LAPACK y usa menos memoria.
+    """
+    return PCA(
+        n_components=n_componentes,
+        svd_solver='randomized',
+        random_state=0,
+        n_oversamples=10,
+        power_iteration_normalizer='QR'
+    )
+
+
 # =============================================================================
 # DIAGNÓSTICOS PCA: Hotelling T² y Q-residuals (SPE)
 # =============================================================================
 
+def _reconstruir(T: np.ndarray, P: np.ndarray) -> np.ndarray:
+    """
+    Reconstruye X̂ = T @ P.T llamando directamente a BLAS GEMM.
+
+    Usa sgemm cuando scores y loadings son float32 y dgemm en otro caso.
+    Se calcula X̂ᵀ = P @ Tᵀ con operandos en orden Fortran (Tᵀ de un T en orden C
+    ya lo es), de modo que BLAS no copia las entradas y la transpuesta del
+    resultado queda en orden C.
+    """
+    gemm = sgemm if (T.dtype == np.float32 and P.dtype == np.float32) else dgemm
+    return gemm(1.0, np.asfortranarray(P), np.asfortranarray(T.T)).T
+
+
 def calcular_diagnosticos_pca(session_id: str) -> Dict[str, Any]:
     """
     Calcula diagnósticos multivariados para PCA:
@@ -144,6 +279,37 @@ def calcular_diagnosticos_pca(session_id: str) -> Dict[str, Any]:
     if session.X_procesado is None:
         raise ValueError("No hay datos preprocesados.")
 
+    # T² y Q dependen solo de estos arrays; cada preprocesamiento o PCA asigna
+    # objetos nuevos, así que basta comparar identidades para invalidar
+    entradas = (
+        session.X_procesado, session.pca_scores, session.pca_loadings,
+        session.feedstock, session.concentration
+    )
+    if session.diagnosticos_cache is not None:
+        entradas_cache, resultado_cache = session.diagnosticos_cache
+        if all(a is b for a, b in zip(entradas, entradas_cache)):
+            return resultado_cache
+
+    resultado = _calcular_diagnosticos(session)
+    session.diagnosticos_cache = (entradas, resultado)
+    return resultado
+
+
+def calcular_diagnosticos_pca_if_ready(session_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Igual que calcular_diagnosticos_pca, pero retorna None en lugar de lanzar
+    ValueError si la sesión no existe o aún no tiene PCA ni datos preprocesados.
+    """
+    session = store.obtener_sesion(session_id)
+    if (not session or session.pca_scores is None or session.pca_loadings is None
+            or session.X_procesado is None):
+        return None
+    return calcular_diagnosticos_pca(session_id)
+
+
+def _calcular_diagnosticos(session) -> Dict[str, Any]:
+    """Cálculo de T², Q, umbrales y outliers (sin caché)."""
+
     X = session.X_procesado  # Datos originales (n_samples x n_features)
     T = session.pca_scores   # Scores (n_samples x n_components)
     P = session.pca_loadings  # Loadings (n_features x n_components)
@@ -186,7 +352,7 @@ def calcular_diagnosticos_pca(session_id: str) -> Dict[str, Any]:
     # =========================================================================
 
     # Reconstrucción de X usando los componentes principales
-    X_reconstructed = T @ P.T
+    X_reconstructed = _reconstruir(T, P)
 
     # Residuos
     E = X - X_reconstructed
@@ -196,9 +362,11 @@ def calcular_diagnosticos_pca(session_id: str) -> Dict[str, Any]:
 
     # Umbral Q usando aproximación de Box (chi-cuadrado)
     # Basado en los eigenvalues no retenidos
+    # Q² se calcula una sola vez y se reutiliza para el tercer momento
+    Q2 = Q * Q
     theta1 = np.sum(Q) / n_samples  # Varianza residual promedio
-    theta2 = np.sum(Q ** 2) / n_samples
-    theta3 = np.sum(Q ** 3) / n_samples
+    theta2 = np.sum(Q2) / n_samples
+    theta3 = np.dot(Q2, Q) / n_samples
 
     if theta2 > 1e-10:
         h0 = 1 - (2 * theta1 * theta3) / (3 * theta2 ** 2)
@@ -243,14 +411,14 @@ def calcular_diagnosticos_pca(session_id: str) -> Dict[str, Any]:
         "outliers_q_99": outliers_Q_99,
         "outliers_combinados": outliers_combinados,
         "estadisticas": {
-            "t2_media": float(np.mean(T2)),
-            "t2_mediana": float(np.median(T2)),
-            "t2_max": float(np.max(T2)),
-            "t2_min": float(np.min(T2)),
-            "q_media": float(np.mean(Q)),
-            "q_mediana": float(np.median(Q)),
-            "q_max": float(np.max(Q)),
-            "q_min": float(np.min(Q)),
+            "t2_media": T2.mean().item(),
+            "t2_mediana": np.median(T2).item(),
+            "t2_max": T2.max().item(),
+            "t2_min": T2.min().item(),
+            "q_media": Q.mean().item(),
+            "q_mediana": np.median(Q).item(),
+            "q_max": Q.max().item(),
+            "q_min": Q.min().item(),
             "n_outliers_t2": len(outliers_T2_95),
             "n_outliers_q": len(outliers_Q_95),
             "n_outliers_combinados": len(outliers_combinados)
@@ -263,23 +431,8 @@ def calcular_diagnosticos_pca(session_id: str) -> Dict[str, Any]:
     }
 
 
-def calcular_contribuciones_muestra(
-    session_id: str,
-    sample_index: int,
-    tipo_metrica: str = "T2"
-) -> Dict[str, Any]:
-    """
-    Calcula las contribuciones de cada variable a T² o Q para una muestra específica.
-    Útil para identificar qué variables causan que una muestra sea outlier.
-
-    Args:
-        session_id: ID de la sesión
-        sample_index: Índice de la muestra a analizar
-        tipo_metrica: "T2" o "Q"
-
-    Returns:
-        Diccionario con contribuciones por variable ordenadas
-    """
+def _validar_sesion_contribuciones(session_id: str):
+    """Obtiene la sesión y verifica que tenga PCA y datos preprocesados."""
     session = store.obtener_sesion(session_id)
     if not session:
         raise ValueError("Sesión no encontrada")
@@ -290,50 +443,55 @@ def calcular_contribuciones_muestra(
     if session.X_procesado is None:
         raise ValueError("No hay datos preprocesados.")
 
-    X = session.X_procesado
-    T = session.pca_scores
-    P = session.pca_loadings
-    variables = session.columnas_seleccionadas
+    return session
 
-    n_samples = X.shape[0]
 
-    if sample_index < 0 or sample_index >= n_samples:
-        raise ValueError(f"Índice de muestra inválido. Debe estar entre 0 y {n_samples - 1}")
+def _matriz_contribuciones(session, indices: np.ndarray, tipo_metrica: str) -> np.ndarray:
+    """
+    Calcula las contribuciones por variable para un conjunto de muestras.
 
-    tipo_metrica = tipo_metrica.upper()
+    Solo se procesan las filas solicitadas, y ambas métricas se resuelven con
+    una única multiplicación de matrices para todo el lote.
+
+    Returns:
+        Array (len(indices) x n_features) con las contribuciones
+    """
+    X = session.X_procesado
+    T = session.pca_scores
+    P = session.pca_loadings
 
     if tipo_metrica == "Q":
         # =====================================================================
         # Contribución al Q-residual
         # La contribución de cada variable es simplemente E[i,j]²
         # =====================================================================
-        X_reconstructed = T @ P.T
-        E = X - X_reconstructed
+        E = X[indices] - _reconstruir(T[indices], P)
+        return E ** 2
 
-        # Contribuciones para la muestra seleccionada
-        contribuciones = E[sample_index, :] ** 2
+    # =========================================================================
+    # Contribución al T²
+    # Usamos la descomposición: T²_i = sum_a (t_ia² / var_a)
+    # La contribución de variable j se calcula proyectando hacia atrás:
+    # contrib_j = (sum_a t_ia * p_ja / sqrt(var_a))²
+    # =========================================================================
+    score_variances = np.var(T, axis=0, ddof=1)
+    score_variances = np.where(score_variances > 1e-10, score_variances, 1e-10)
 
-    elif tipo_metrica == "T2":
-        # =====================================================================
-        # Contribución al T²
-        # Usamos la descomposición: T²_i = sum_a (t_ia² / var_a)
-        # La contribución de variable j se calcula proyectando hacia atrás
-        # =====================================================================
-        score_variances = np.var(T, axis=0, ddof=1)
-        score_variances = np.where(score_variances > 1e-10, score_variances, 1e-10)
+    # Scores normalizados de las muestras
+    t_normalized = T[indices] / np.sqrt(score_variances)
 
-        # Scores normalizados de la muestra
-        t_normalized = T[sample_index, :] / np.sqrt(score_variances)
+    return _reconstruir(t_normalized, P) ** 2
 
-        # Contribución de cada variable usando loadings
-        # contrib_j = sum_a (t_ia * p_ja / sqrt(var_a))²
-        contribuciones = np.zeros(len(variables))
-        for j in range(len(variables)):
-            contrib = np.sum(t_normalized * P[j, :])
-            contribuciones[j] = contrib ** 2
 
-    else:
-        raise ValueError("tipo_metrica debe ser 'T2' o 'Q'")
+def _formatear_contribuciones(
+    session,
+    sample_index: int,
+    contribuciones: np.ndarray,
+    indices_ordenados: np.ndarray,
+    tipo_metrica: str
+) -> Dict[str, Any]:
+    """Construye la respuesta de contribuciones para una muestra."""
+    variables = session.columnas_seleccionadas
 
     # Normalizar contribuciones como porcentaje del total
     total = np.sum(contribuciones)
@@ -342,22 +500,24 @@ def calcular_contribuciones_muestra(
     else:
         contribuciones_pct = contribuciones
 
-    # Ordenar de mayor a menor
-    indices_ordenados = np.argsort(contribuciones)[::-1]
+    # Conversión a escalares Python en bloque (evita float() por elemento)
+    valores_ordenados = contribuciones[indices_ordenados].tolist()
+    porcentajes_ordenados = contribuciones_pct[indices_ordenados].tolist()
 
-    contribuciones_ordenadas = []
-    for idx in indices_ordenados:
-        contribuciones_ordenadas.append({
+    contribuciones_ordenadas = [
+        {
             "variable": variables[idx],
-            "contribucion_valor": float(contribuciones[idx]),
-            "contribucion_porcentaje": float(contribuciones_pct[idx])
-        })
+            "contribucion_valor": valor,
+            "contribucion_porcentaje": porcentaje
+        }
+        for idx, valor, porcentaje in zip(indices_ordenados.tolist(), valores_ordenados, porcentajes_ordenados)
+    ]
 
     # Información de la muestra
     info_muestra = {
         "indice": sample_index,
-        "feedstock": int(session.feedstock[sample_index]) if session.feedstock is not None else None,
-        "concentration": int(session.concentration[sample_index]) if session.concentration is not None else None
+        "feedstock": session.feedstock[sample_index].item() if session.feedstock is not None else None,
+        "concentration": session.concentration[sample_index].item() if session.concentration is not None else None
     }
 
     return {
@@ -371,6 +531,76 @@ def calcular_contribuciones_muestra(
     }
 
 
+def calcular_contribuciones_muestra(
+    session_id: str,
+    sample_index: int,
+    tipo_metrica: str = "T2"
+) -> Dict[str, Any]:
+    """
+    Calcula las contribuciones de cada variable a T² o Q para una muestra específica.
+    Útil para identificar qué variables causan que una muestra sea outlier.
+
+    Args:
+        session_id: ID de la sesión
+        sample_index: Índice de la muestra a analizar
+        tipo_metrica: "T2" o "Q"
+
+    Returns:
+        Diccionario con contribuciones por variable ordenadas
+    """
+    resultado = calcular_contribuciones_batch(session_id, [sample_index], tipo_metrica)
+    return resultado["resultados"][0]
+
+
+def calcular_contribuciones_batch(
+    session_id: str,
+    sample_indices: List[int],
+    tipo_metrica: str = "T2"
+) -> Dict[str, Any]:
+    """
+    Calcula las contribuciones a T² o Q para varias muestras en una sola pasada.
+    Útil para revisar todos los outliers detectados sin una petición por muestra.
+
+    Args:
+        session_id: ID de la sesión
+        sample_indices: Índices de las muestras a analizar
+        tipo_metrica: "T2" o "Q"
+
+    Returns:
+        Diccionario con el tipo de métrica y una entrada por muestra
+        (mismo formato que calcular_contribuciones_muestra)
+    """
+    session = _validar_sesion_contribuciones(session_id)
+
+    n_samples = session.X_procesado.shape[0]
+
+    if not sample_indices:
+        raise ValueError("Debes proporcionar al menos un índice de muestra")
+
+    indices = np.asarray(sample_indices, dtype=np.intp)
+    if indices.min() < 0 or indices.max() >= n_samples:
+        raise ValueError(f"Índice de muestra inválido. Debe estar entre 0 y {n_samples - 1}")
+
+    tipo_metrica = tipo_metrica.upper()
+    if tipo_metrica not in ("T2", "Q"):
+        raise ValueError("tipo_metrica debe ser 'T2' o 'Q'")
+
+    contribuciones = _matriz_contribuciones(session, indices, tipo_metrica)
+
+    # Ordenar de mayor a menor (todas las filas a la vez)
+    orden = np.argsort(contribuciones, axis=1)[:, ::-1]
+
+    resultados = [
+        _formatear_contribuciones(session, idx, contribuciones[fila], orden[fila], tipo_metrica)
+        for fila, idx in enumerate(indices.tolist())
+    ]
+
+    return {
+        "tipo_metrica": tipo_metrica,
+        "resultados": resultados
+    }
+
+
 def _generar_interpretacion_contribuciones(top_contribuciones: List[Dict], tipo_metrica: str) -> str:
     """Genera texto interpretativo para las contribuciones."""
     if not top_contribuciones:
@@ -392,10 +622,29 @@ def _generar_interpretacion_contribuciones(top_contribuciones: List[Dict], tipo_
 # AUTO-OPTIMIZACIÓN DEL NÚMERO DE COMPONENTES PRINCIPALES
 # =============================================================================
 
+# Por encima de este tamaño de X se ajusta el PCA por lotes (IncrementalPCA)
+UMBRAL_PCA_INCREMENTAL_BYTES = 256 * 1024 * 1024
+
+
+def _ajustar_pca_incremental(X: np.ndarray, n_componentes: int) -> IncrementalPCA:
+    """
+    Ajusta un IncrementalPCA recorriendo X por lotes con partial_fit.
+    La memoria de trabajo es lineal en el tamaño del lote y no en n_samples.
+    """
+    batch_size = max(n_componentes * 5, 512)
+    ipca = IncrementalPCA(n_components=n_componentes, batch_size=batch_size)
+    # min_batch_size evita un último lote con menos muestras que componentes
+    for lote in gen_batches(X.shape[0], batch_size, min_batch_size=n_componentes):
+        ipca.partial_fit(X[lote])
+    return ipca
+
+
 def calcular_optimizacion_pcs(
     session_id: str,
     k_max: Optional[int] = None,
-    umbral_varianza: float = 0.90
+    umbral_varianza: float = 0.90,
+    incremental: Optional[bool] = None,
+    incluir_errores: bool = True
 ) -> Dict[str, Any]:
     """
     Analiza diferentes números de componentes principales para recomendar
@@ -408,6 +657,11 @@ def calcular_optimizacion_pcs(
         session_id: ID de la sesión
         k_max: Máximo número de componentes a evaluar (None = automático)
         umbral_varianza: Umbral de varianza explicada para recomendar (default 0.90)
+        incremental: Ajustar con IncrementalPCA por lotes (None = automático según
+            el tamaño de X)
+        incluir_errores: Calcular el error de reconstrucción por k. Si es False
+            solo se obtiene la recomendación (el codo se busca en la varianza
+            acumulada) y los resultados por k omiten los campos de error
 
     Returns:
         Diccionario con análisis y recomendación
@@ -421,6 +675,9 @@ def calcular_optimizacion_pcs(
 
     X = session.X_procesado
     n_samples, n_features = X.shape
+    # Los ajustes corren en precisión simple (no-op si X ya es float32 contiguo);
+    # las sumas para el error de reconstrucción se acumulan en float64
+    X32 = np.ascontiguousarray(X, dtype=np.float32)
 
     # Determinar k_max
     if k_max is None:
@@ -431,32 +688,52 @@ def calcular_optimizacion_pcs(
     # =========================================================================
     # Calcular PCA con todos los componentes posibles
     # =========================================================================
-    pca_full = PCA(n_components=k_max)
-    pca_full.fit(X)
+    # Reutilizar el PCA de la sesión si se ajustó sobre estos mismos datos
+    # con al menos k_max componentes
+    reutilizar_pca = (
+        session.pca_varianza is not None
+        and session.pca_X_origen is X
+        and len(session.pca_varianza) >= k_max
+    )
+
+    if reutilizar_pca:
+        varianza_individual = session.pca_varianza[:k_max]
+        varianza_componentes = None
+        if incluir_errores:
+            # explained_variance_ = ratio · varianza total (misma definición que sklearn)
+            varianza_total = np.var(X, axis=0, ddof=1, dtype=np.float64).sum()
+            varianza_componentes = varianza_individual * varianza_total
+    else:
+        if incremental is None:
+            incremental = X.nbytes > UMBRAL_PCA_INCREMENTAL_BYTES
+
+        if incremental:
+            pca_full = _ajustar_pca_incremental(X32, k_max)
+        else:
+            pca_full = _pca_aleatorizado(k_max)
+            pca_full.fit(X32)
+
+        varianza_individual = pca_full.explained_variance_ratio_
+        varianza_componentes = pca_full.explained_variance_
 
-    varianza_individual = pca_full.explained_variance_ratio_
     varianza_acumulada = np.cumsum(varianza_individual)
 
     # =========================================================================
     # Calcular error de reconstrucción para cada k
     # =========================================================================
-    errores_reconstruccion = []
-
-    for k in range(1, k_max + 1):
-        # Reconstruir usando k componentes
-        scores_k = pca_full.transform(X)[:, :k]
-        loadings_k = pca_full.components_[:k, :]
-        X_reconstructed = scores_k @ loadings_k
-
-        # Error cuadrático medio
-        error = np.mean((X - X_reconstructed) ** 2)
-        errores_reconstruccion.append(error)
-
-    errores_reconstruccion = np.array(errores_reconstruccion)
-
-    # Normalizar errores para visualización (0-100%)
-    error_max = errores_reconstruccion[0] if errores_reconstruccion[0] > 0 else 1
-    errores_normalizados = (errores_reconstruccion / error_max) * 100
+    # Forma cerrada: la reconstrucción con k PCs (sin sumar la media) deja un
+    # error cuadrático total ||X||² - (n-1)·sum(lambda_1..k), ya que los residuos
+    # centrados suman cero y no se cruzan con la media. No hace falta reconstruir X.
+    errores_reconstruccion = None
+    errores_normalizados = None
+    if incluir_errores:
+        suma_cuadrados = np.einsum('ij,ij->', X, X, dtype=np.float64)
+        varianza_capturada = (n_samples - 1) * np.cumsum(varianza_componentes, dtype=np.float64)
+        errores_reconstruccion = np.maximum(suma_cuadrados - varianza_capturada, 0.0) / X.size
+
+        # Normalizar errores para visualización (0-100%)
+        error_max = errores_reconstruccion[0] if errores_reconstruccion[0] > 0 else 1
+        errores_normalizados = (errores_reconstruccion / error_max) * 100
 
     # =========================================================================
     # Determinar número óptimo de componentes
@@ -471,8 +748,12 @@ def calcular_optimizacion_pcs(
     if k_por_varianza is None:
         k_por_varianza = k_max
 
-    # Criterio 2: Método del codo en error de reconstrucción
-    k_por_codo = _encontrar_codo(errores_reconstruccion)
+    # Criterio 2: Método del codo en error de reconstrucción. El error es una
+    # función afín de la varianza acumulada y la distancia a la cuerda es
+    # invariante a transformaciones afines: sin errores se usa esa curva
+    k_por_codo = _encontrar_codo(
+        errores_reconstruccion if incluir_errores else varianza_acumulada
+    )
 
     # Criterio 3: Varianza individual > 5% (cada componente debe ser significativo)
     k_por_significancia = 1
@@ -502,15 +783,23 @@ def calcular_optimizacion_pcs(
     # =========================================================================
     # Preparar datos para gráficos
     # =========================================================================
-    resultados_por_k = []
-    for k in range(1, k_max + 1):
-        resultados_por_k.append({
-            "k": k,
-            "varianza_individual": float(varianza_individual[k - 1] * 100),
-            "varianza_acumulada": float(varianza_acumulada[k - 1] * 100),
-            "error_reconstruccion": float(errores_reconstruccion[k - 1]),
-            "error_normalizado": float(errores_normalizados[k - 1])
-        })
+    # Columnas convertidas en bloque y combinadas por k (sin float() por elemento)
+    resultados_por_k = [
+        {"k": k, "varianza_individual": vi, "varianza_acumulada": va}
+        for k, vi, va in zip(
+            range(1, k_max + 1),
+            (varianza_individual * 100).tolist(),
+            (varianza_acumulada * 100).tolist()
+        )
+    ]
+    if incluir_errores:
+        for resultado, er, en in zip(
+            resultados_por_k,
+            errores_reconstruccion.tolist(),
+            errores_normalizados.tolist()
+        ):
+            resultado["error_reconstruccion"] = er
+            resultado["error_normalizado"] = en
 
     return {
         "resultados": resultados_por_k,
@@ -525,38 +814,86 @@ def calcular_optimizacion_pcs(
             "umbral_varianza_usado": umbral_varianza
         },
         "interpretacion": _generar_interpretacion_optimizacion(
-            k_recomendado, varianza_recomendada, k_max, resultados_por_k
+            k_recomendado, varianza_recomendada, k_max, varianza_acumulada
         )
     }
 
 
+# Puntos consecutivos sin aumento de distancia tras los que se da el codo por encontrado
+PACIENCIA_CODO = 3
+
+
+def _codo_escalar(y: np.ndarray, paciencia: int) -> int:
+    """
+    Índice del codo con un único bucle escalar: calcula la distancia de cada
+    punto a la cuerda sobre la marcha y se detiene tras `paciencia` puntos sin
+    mejora, sin evaluar la cola de la curva. Se compila con numba si está
+    disponible (la normalización por la longitud de la cuerda no cambia el máximo).
+    """
+    n = y.shape[0]
+    dx = n - 1.0
+    dy = y[n - 1] - y[0]
+    mejor = -1.0
+    indice_mejor = 0
+    sin_mejora = 0
+    for i in range(n):
+        d = abs(dx * (y[0] - y[i]) + dy * i)
+        if d > mejor:
+            mejor = d
+            indice_mejor = i
+            sin_mejora = 0
+        else:
+            sin_mejora += 1
+            if sin_mejora >= paciencia:
+                break
+    return indice_mejor
+
+
+_codo_numba = njit(cache=True, fastmath=True)(_codo_escalar) if NUMBA_AVAILABLE else None
+
+
 def _encontrar_codo(valores: np.ndarray) -> int:
     """
     Encuentra el punto de codo usando el método de la distancia máxima
     desde la línea que conecta el primer y último punto.
     """
+    return _encontrar_codo_cache(tuple(np.asarray(valores, dtype=np.float64).tolist()))
+
+
+@lru_cache(maxsize=128)
+def _encontrar_codo_cache(valores: Tuple[float, ...]) -> int:
+    """Implementación memoizada de _encontrar_codo (la curva como tupla hashable)."""
     n = len(valores)
     if n < 3:
         return 1
 
-    # Normalizar para cálculo
-    x = np.arange(n)
-    y = valores
+    y = np.asarray(valores, dtype=np.float64)
 
-    # Línea desde el primer al último punto
-    p1 = np.array([0, y[0]])
-    p2 = np.array([n - 1, y[-1]])
+    if _codo_numba is not None:
+        return max(1, _codo_numba(y, PACIENCIA_CODO) + 1)  # +1 porque k empieza en 1
 
-    # Calcular distancia de cada punto a la línea
-    distancias = []
-    for i in range(n):
-        p = np.array([i, y[i]])
-        # Distancia punto a línea
-        d = np.abs(np.cross(p2 - p1, p1 - p)) / np.linalg.norm(p2 - p1)
-        distancias.append(d)
+    x = np.arange(n, dtype=np.float64)
 
-    # El codo es el punto con máxima distancia
-    codo = np.argmax(distancias) + 1  # +1 porque k empieza en 1
+    # Línea desde el primer (0, y0) al último punto (n-1, y_n)
+    dx = n - 1
+    dy = y[-1] - y[0]
+
+    # Distancia de cada punto a la línea (producto cruz 2D, vectorizado)
+    distancias = np.abs(dx * (y[0] - y) + dy * x) / np.hypot(dx, dy)
+
+    # El codo es el punto con máxima distancia. En curvas de error/varianza la
+    # distancia a la cuerda es unimodal: tras PACIENCIA_CODO puntos sin mejorar
+    # el máximo ya no cambia y se corta el recorrido
+    mejor, indice_mejor, sin_mejora = -1.0, 0, 0
+    for i, d in enumerate(distancias.tolist()):
+        if d > mejor:
+            mejor, indice_mejor, sin_mejora = d, i, 0
+        else:
+            sin_mejora += 1
+            if sin_mejora >= PACIENCIA_CODO:
+                break
+
+    codo = indice_mejor + 1  # +1 porque k empieza en 1
     return max(1, codo)
 
 
@@ -564,12 +901,14 @@ def _generar_interpretacion_optimizacion(
     k_rec: int,
     var_rec: float,
     k_max: int,
-    resultados: List[Dict]
+    varianza_acumulada: np.ndarray
 ) -> str:
     """Genera texto interpretativo para la optimización."""
-    # Encontrar cuántos PCs para 80% y 95%
-    k_80 = next((r["k"] for r in resultados if r["varianza_acumulada"] >= 80), k_max)
-    k_95 = next((r["k"] for r in resultados if r["varianza_acumulada"] >= 95), k_max)
+    # Encontrar cuántos PCs para 80% y 95%: la varianza acumulada es monótona,
+    # así que basta una búsqueda binaria (índice == k_max si no se alcanza)
+    k_80, k_95 = np.minimum(
+        np.searchsorted(varianza_acumulada * 100, [80, 95]) + 1, k_max
+    ).tolist()
 
     texto = f"Se recomienda usar {k_rec} componentes principales, explicando {var_rec:.1f}% de la varianza total. "
 
@@ -589,6 +928,35 @@ def _generar_interpretacion_optimizacion(
 # PROYECCIONES DIMENSIONALES (2D/3D) Y MAPA QUÍMICO
 # =============================================================================
 
+def _preproyectar(X: np.ndarray, n_dims: int = 50) -> np.ndarray:
+    """
+    Reduce espectros anchos a n_dims PCs antes de UMAP/t-SNE: el costo de la
+    búsqueda de vecinos y de cada iteración crece con la dimensión de entrada.
+    """
+    if X.shape[1] > n_dims:
+        return _pca_aleatorizado(n_dims).fit_transform(X)
+    return X
+
+
+def _columna_json(valores, n: int) -> list:
+    """Convierte una columna opcional (array o lista) a lista JSON; None -> [None]*n."""
+    if valores is None:
+        return [None] * n
+    if isinstance(valores, np.ndarray):
+        return valores.tolist()
+    return list(valores)
+
+
+def _clave_embedding(metodo: str, X: np.ndarray, n_neighbors: int, min_dist: float) -> tuple:
+    """
+    Clave de caché de un embedding UMAP/t-SNE. t-SNE ignora n_neighbors y
+    min_dist; la forma y la dirección del buffer identifican la matriz.
+    """
+    if metodo == "tsne":
+        n_neighbors, min_dist = None, None
+    return (metodo, n_neighbors, min_dist, X.shape, X.ctypes.data)
+
+
 def obtener_proyeccion_3d(session_id: str) -> Dict[str, Any]:
     """
     Obtiene los scores de PCA para visualización 3D (PC1, PC2, PC3).
@@ -622,42 +990,58 @@ def obtener_proyeccion_3d(session_id: str) -> Dict[str, Any]:
         t2_values = None
         q_values = None
 
-    # Preparar datos para scatter 3D
-    puntos = []
-    for i in range(T.shape[0]):
-        punto = {
+    # Preparar datos para scatter 3D: columnas convertidas en bloque y
+    # combinadas fila a fila (sin float()/int() por elemento)
+    n_samples = T.shape[0]
+    columnas = zip(
+        T[:, 0].tolist(),
+        T[:, 1].tolist(),
+        T[:, 2].tolist(),
+        _columna_json(session.feedstock, n_samples),
+        _columna_json(session.concentration, n_samples),
+        _columna_json(session.cluster_labels, n_samples),
+        _columna_json(t2_values, n_samples),
+        _columna_json(q_values, n_samples)
+    )
+    puntos = [
+        {
             "id": i,
-            "PC1": float(T[i, 0]),
-            "PC2": float(T[i, 1]),
-            "PC3": float(T[i, 2]),
-            "feedstock": int(session.feedstock[i]) if session.feedstock is not None else None,
-            "concentration": int(session.concentration[i]) if session.concentration is not None else None,
-            "cluster": int(session.cluster_labels[i]) if session.cluster_labels is not None else None,
-            "T2": float(t2_values[i]) if t2_values else None,
-            "Q": float(q_values[i]) if q_values else None
+            "PC1": pc1,
+            "PC2": pc2,
+            "PC3": pc3,
+            "feedstock": fs,
+            "concentration": conc,
+            "cluster": cluster,
+            "T2": t2,
+            "Q": q
         }
-        puntos.append(punto)
+        for i, (pc1, pc2, pc3, fs, conc, cluster, t2, q) in enumerate(columnas)
+    ]
 
     # Loadings para biplot 3D (opcional)
     loadings_3d = None
     if session.pca_loadings is not None:
-        loadings_3d = []
-        for i, var in enumerate(session.columnas_seleccionadas):
-            loadings_3d.append({
-                "variable": var,
-                "PC1": float(session.pca_loadings[i, 0]),
-                "PC2": float(session.pca_loadings[i, 1]),
-                "PC3": float(session.pca_loadings[i, 2])
-            })
+        P = session.pca_loadings
+        loadings_3d = [
+            {"variable": var, "PC1": pc1, "PC2": pc2, "PC3": pc3}
+            for var, pc1, pc2, pc3 in zip(
+                session.columnas_seleccionadas,
+                P[:, 0].tolist(),
+                P[:, 1].tolist(),
+                P[:, 2].tolist()
+            )
+        ]
 
     # Varianza explicada
     varianza = None
     if session.pca_varianza is not None:
+        v3 = session.pca_varianza[:3] * 100
+        pc1, pc2, pc3 = v3.tolist()
         varianza = {
-            "PC1": float(session.pca_varianza[0] * 100),
-            "PC2": float(session.pca_varianza[1] * 100),
-            "PC3": float(session.pca_varianza[2] * 100),
-            "total_3d": float(sum(session.pca_varianza[:3]) * 100)
+            "PC1": pc1,
+            "PC2": pc2,
+            "PC3": pc3,
+            "total_3d": float(v3.sum())
         }
 
     return {
@@ -698,42 +1082,58 @@ def obtener_mapa_quimico(
 
     X = session.X_procesado
     n_samples = X.shape[0]
+    # Precisión simple para PCA/UMAP/t-SNE: basta para visualización
+    X32 = np.ascontiguousarray(X, dtype=np.float32)
 
     metodo = metodo.lower()
+    clave_embedding = _clave_embedding(metodo, X, n_neighbors, min_dist)
 
     if metodo == "pca":
         # Usar scores de PCA existentes o calcular
         if session.pca_scores is not None and session.pca_scores.shape[1] >= 2:
             coords = session.pca_scores[:, :2]
-            varianza_info = {
-                "dim1": float(session.pca_varianza[0] * 100) if session.pca_varianza is not None else None,
-                "dim2": float(session.pca_varianza[1] * 100) if session.pca_varianza is not None else None
-            }
+            if session.pca_varianza is not None:
+                dim1, dim2 = (session.pca_varianza[:2] * 100).tolist()
+            else:
+                dim1 = dim2 = None
+            varianza_info = {"dim1": dim1, "dim2": dim2}
         else:
-            pca = PCA(n_components=2)
-            coords = pca.fit_transform(X)
+            pca = _pca_aleatorizado(2)
+            coords = pca.fit_transform(X32)
             varianza_info = {
                 "dim1": float(pca.explained_variance_ratio_[0] * 100),
                 "dim2": float(pca.explained_variance_ratio_[1] * 100)
             }
         metodo_usado = "PCA"
 
+    elif clave_embedding in session.embeddings_cache:
+        # Embedding UMAP/t-SNE ya calculado con los mismos parámetros sobre la misma matriz
+        coords = session.embeddings_cache[clave_embedding]
+        varianza_info = None
+        metodo_usado = "UMAP" if metodo == "umap" else "t-SNE"
+
     elif metodo == "umap":
         try:
             import umap
+            # random_state fija el resultado; umap fuerza entonces n_jobs=1, así
+            # que no se pide paralelismo. Los vecinos aproximados (pynndescent)
+            # se usan automáticamente para n grande.
             reducer = umap.UMAP(
                 n_neighbors=min(n_neighbors, n_samples - 1),
                 min_dist=min_dist,
                 n_components=2,
+                init='spectral',
+                low_memory=True,
                 random_state=42
             )
-            coords = reducer.fit_transform(X)
+            coords = reducer.fit_transform(_preproyectar(X32))
+            session.embeddings_cache[clave_embedding] = coords
             varianza_info = None  # UMAP no tiene varianza explicada
             metodo_usado = "UMAP"
         except ImportError:
             # Fallback a PCA si UMAP no está instalado
-            pca = PCA(n_components=2)
-            coords = pca.fit_transform(X)
+            pca = _pca_aleatorizado(2)
+            coords = pca.fit_transform(X32)
             varianza_info = {
                 "dim1": float(pca.explained_variance_ratio_[0] * 100),
                 "dim2": float(pca.explained_variance_ratio_[1] * 100)
@@ -742,14 +1142,19 @@ def obtener_mapa_quimico(
 
     elif metodo == "tsne":
         from sklearn.manifold import TSNE
-        perplexity = min(30, n_samples - 1)
+        X_tsne = _preproyectar(X32)
+        perplexity = min(30, n_samples - 1, max(5, (n_samples - 1) // 3))
         tsne = TSNE(
             n_components=2,
             perplexity=perplexity,
-            random_state=42,
-            n_iter=1000
+            init='pca',
+            learning_rate='auto',
+            method='barnes_hut',
+            n_jobs=-1,
+            random_state=42
         )
-        coords = tsne.fit_transform(X)
+        coords = tsne.fit_transform(X_tsne)
+        session.embeddings_cache[clave_embedding] = coords
         varianza_info = None  # t-SNE no tiene varianza explicada
         metodo_usado = "t-SNE"
 
@@ -767,21 +1172,36 @@ def obtener_mapa_quimico(
         q_values = None
         outliers = []
 
-    # Preparar puntos
-    puntos = []
-    for i in range(n_samples):
-        punto = {
+    # Máscara booleana de outliers: una asignación vectorizada en lugar de
+    # una búsqueda de pertenencia por muestra
+    es_outlier = np.zeros(n_samples, dtype=bool)
+    es_outlier[outliers] = True
+
+    # Preparar puntos a partir de columnas convertidas en bloque
+    columnas = zip(
+        coords[:, 0].tolist(),
+        coords[:, 1].tolist(),
+        _columna_json(session.feedstock, n_samples),
+        _columna_json(session.concentration, n_samples),
+        _columna_json(session.cluster_labels, n_samples),
+        _columna_json(t2_values, n_samples),
+        _columna_json(q_values, n_samples),
+        es_outlier.tolist()
+    )
+    puntos = [
+        {
             "id": i,
-            "x": float(coords[i, 0]),
-            "y": float(coords[i, 1]),
-            "feedstock": int(session.feedstock[i]) if session.feedstock is not None else None,
-            "concentration": int(session.concentration[i]) if session.concentration is not None else None,
-            "cluster": int(session.cluster_labels[i]) if session.cluster_labels is not None else None,
-            "T2": float(t2_values[i]) if t2_values else None,
-            "Q": float(q_values[i]) if q_values else None,
-            "es_outlier": i in outliers
+            "x": x,
+            "y": y,
+            "feedstock": fs,
+            "concentration": conc,
+            "cluster": cluster,
+            "T2": t2,
+            "Q": q,
+            "es_outlier": outlier
         }
-        puntos.append(punto)
+        for i, (x, y, fs, conc, cluster, t2, q, outlier) in enumerate(columnas)
+    ]
 
     return {
         "metodo": metodo_usado,
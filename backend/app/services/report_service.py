@@ -3,14 +3,27 @@ Servicio para Generación de Reportes
 Genera resúmenes interpretativos y exportación a PDF
 """
 
+import re
+import importlib.util
 import numpy as np
-from typing import Dict, Any, Optional, List
-from io import BytesIO
+from typing import Dict, Any, Optional, List, Tuple, BinaryIO
 from datetime import datetime
+from types import SimpleNamespace
 
 from app.services.store import store
 from app.services import pca_service
 
+# Intentar importar numba (opcional) para el top-k de loadings
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# Disponibilidad de UMAP para el resumen: find_spec no importa el paquete
+# (ni dispara la carga de numba), y el resultado no cambia en el proceso
+UMAP_AVAILABLE = importlib.util.find_spec("umap") is not None
+
 
 # Mapeos de etiquetas
 FEEDSTOCK_LABELS = {
@@ -33,108 +46,183 @@ CONCENTRATION_LABELS = {
     7: "Desconocida"
 }
 
+# Nombres de feedstock indexables directamente por código (0..max)
+_FEEDSTOCK_NOMBRES = tuple(
+    FEEDSTOCK_LABELS.get(codigo, f"Tipo {codigo}") for codigo in range(max(FEEDSTOCK_LABELS) + 1)
+)
+
+
+def _top_indices(valores: np.ndarray, k: int = 3) -> np.ndarray:
+    """
+    Índices de los k valores más grandes, en orden descendente.
+    argpartition selecciona en O(V) y solo se ordenan los k candidatos.
+    """
+    if valores.shape[0] <= k:
+        return np.argsort(valores)[::-1]
+    candidatos = np.argpartition(valores, -k)[-k:]
+    return candidatos[np.argsort(valores[candidatos])[::-1]]
+
+
+def _top_k_abs_escalar(columna: np.ndarray, k: int) -> np.ndarray:
+    """
+    Índices de los k valores de mayor |valor|, en orden descendente, en una sola
+    pasada: mantiene los k mejores ordenados por inserción, sin crear el
+    temporal np.abs(columna). Se compila con numba si está disponible.
+    """
+    k = min(k, columna.shape[0])
+    mejores_val = np.full(k, -1.0)
+    mejores_idx = np.zeros(k, dtype=np.int64)
+    for i in range(columna.shape[0]):
+        v = abs(columna[i])
+        if v > mejores_val[k - 1]:
+            j = k - 1
+            while j > 0 and v > mejores_val[j - 1]:
+                mejores_val[j] = mejores_val[j - 1]
+                mejores_idx[j] = mejores_idx[j - 1]
+                j -= 1
+            mejores_val[j] = v
+            mejores_idx[j] = i
+    return mejores_idx
+
+
+_top_k_abs_numba = njit(cache=True)(_top_k_abs_escalar) if NUMBA_AVAILABLE else None
+
+
+def _top_indices_abs(columna: np.ndarray, k: int = 3) -> np.ndarray:
+    """Índices de los k loadings de mayor magnitud, en orden descendente."""
+    if _top_k_abs_numba is not None:
+        return _top_k_abs_numba(columna, k)
+    return _top_indices(np.abs(columna), k)
+
 
 def generar_interpretacion_pca(session) -> Optional[str]:
     """Genera interpretación textual del análisis PCA"""
     if session.pca_varianza is None:
         return None
 
-    varianza = session.pca_varianza * 100
+    # Porcentajes y PCs para el 80% precalculados al ajustar el PCA
+    varianza = session.pca_varianza_pct
     n_componentes = len(varianza)
-    var_acumulada = np.cumsum(varianza)
+    var_acumulada = session.pca_var_acumulada
+    pcs_80 = session.pcs_80
 
-    # Encontrar cuántos PCs explican el 80% de varianza
-    pcs_80 = np.searchsorted(var_acumulada, 80) + 1
-
-    interpretacion = []
-
-    # Varianza explicada
-    interpretacion.append(
-        f"Se calcularon {n_componentes} componentes principales. "
-        f"El PC1 explica {varianza[0]:.1f}% de la varianza total"
-    )
-    if n_componentes > 1:
-        interpretacion.append(f" y el PC2 añade {varianza[1]:.1f}% adicional")
-    interpretacion.append(".")
+    # Fragmentos opcionales; el texto se arma con una sola plantilla al final
+    texto_pc2 = f" y el PC2 añade {varianza[1]:.1f}% adicional" if n_componentes > 1 else ""
 
     # Componentes necesarios para 80%
-    if pcs_80 <= n_componentes:
-        interpretacion.append(
-            f" Con {pcs_80} componentes se captura el {var_acumulada[pcs_80-1]:.1f}% de la varianza, "
-            f"lo cual es suficiente para representar la estructura principal de los datos."
-        )
+    texto_80 = (
+        f" Con {pcs_80} componentes se captura el {var_acumulada[pcs_80-1]:.1f}% de la varianza, "
+        f"lo cual es suficiente para representar la estructura principal de los datos."
+    ) if pcs_80 <= n_componentes else ""
 
     # Análisis de loadings
-    if session.pca_loadings is not None and len(session.columnas_seleccionadas) > 0:
+    texto_loadings = ""
+    variables = session.columnas_seleccionadas
+    if session.pca_loadings is not None and len(variables) > 0:
         loadings = session.pca_loadings
-        variables = session.columnas_seleccionadas
 
-        # Top variables en PC1
-        pc1_loadings = np.abs(loadings[:, 0])
-        top3_pc1 = np.argsort(pc1_loadings)[-3:][::-1]
-        vars_pc1 = [variables[i] for i in top3_pc1]
+        # Top variables en PC1 (y PC2 si existe)
+        vars_pc1 = ", ".join(variables[i] for i in _top_indices_abs(loadings[:, 0]))
+        vars_pc2 = (
+            ", ".join(variables[i] for i in _top_indices_abs(loadings[:, 1]))
+            if n_componentes > 1 else None
+        )
 
-        interpretacion.append(
-            f"\n\nLas variables más influyentes en PC1 son: {', '.join(vars_pc1)}. "
+        texto_loadings = (
+            f"\n\nLas variables más influyentes en PC1 son: {vars_pc1}. "
             f"Estas variables son las que mejor discriminan entre las muestras."
+            f"{f' Para PC2, las más importantes son: {vars_pc2}.' if vars_pc2 else ''}"
         )
 
-        if n_componentes > 1:
-            pc2_loadings = np.abs(loadings[:, 1])
-            top3_pc2 = np.argsort(pc2_loadings)[-3:][::-1]
-            vars_pc2 = [variables[i] for i in top3_pc2]
-            interpretacion.append(
-                f" Para PC2, las más importantes son: {', '.join(vars_pc2)}."
-            )
+    return (
+        f"Se calcularon {n_componentes} componentes principales. "
+        f"El PC1 explica {varianza[0]:.1f}% de la varianza total{texto_pc2}."
+        f"{texto_80}{texto_loadings}"
+    )
 
-    return "".join(interpretacion)
 
+def _distribucion_clusters(labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Clusters presentes, número de muestras y porcentaje de cada uno.
 
-def generar_interpretacion_clustering(session) -> Optional[str]:
-    """Genera interpretación textual del análisis de clustering"""
+    Las etiquetas son enteros pequeños no negativos, así que bincount cuenta
+    en una pasada sin ordenar.
+    """
+    conteos = np.bincount(labels.astype(np.intp, copy=False))
+    unique = np.flatnonzero(conteos)
+    counts = conteos[unique]
+    return unique, counts, counts / labels.size * 100.0
+
+
+def generar_interpretacion_clustering(
+    session,
+    *,
+    distribucion: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+) -> Optional[str]:
+    """
+    Genera interpretación textual del análisis de clustering.
+
+    distribucion: resultado de _distribucion_clusters, si el llamador ya lo calculó.
+    """
     if session.cluster_labels is None:
         return None
 
-    labels = session.cluster_labels
-    n_clusters = len(np.unique(labels))
+    labels = session.cluster_labels.astype(np.intp, copy=False)
 
-    # Contar muestras por cluster
-    unique, counts = np.unique(labels, return_counts=True)
-
-    interpretacion = []
-    interpretacion.append(
-        f"Se identificaron {n_clusters} grupos (clusters) en los datos usando el método "
-        f"{session.cluster_metodo or 'K-means'}. "
-    )
+    if distribucion is None:
+        distribucion = _distribucion_clusters(labels)
+    unique, counts, porcentajes = distribucion
+    n_clusters = len(unique)
 
     # Distribución de clusters
-    for i, (cluster_id, count) in enumerate(zip(unique, counts)):
-        pct = (count / len(labels)) * 100
-        interpretacion.append(f"El grupo {cluster_id + 1} contiene {count} muestras ({pct:.1f}%). ")
+    texto_distribucion = "".join(
+        f"El grupo {cluster_id + 1} contiene {count} muestras ({pct:.1f}%). "
+        for cluster_id, count, pct in zip(unique.tolist(), counts.tolist(), porcentajes.tolist())
+    )
 
     # Análisis con feedstock si está disponible
+    texto_feedstock = ""
     if session.feedstock is not None:
-        interpretacion.append("\n\nRelación con feedstock: ")
-        for cluster_id in unique:
-            mask = labels == cluster_id
-            feedstocks_en_cluster = session.feedstock[mask]
-            unique_fs, counts_fs = np.unique(feedstocks_en_cluster, return_counts=True)
-            fs_principal = unique_fs[np.argmax(counts_fs)]
-            fs_nombre = FEEDSTOCK_LABELS.get(int(fs_principal), f"Tipo {fs_principal}")
-            pct = (np.max(counts_fs) / np.sum(counts_fs)) * 100
-            interpretacion.append(
-                f"Grupo {cluster_id + 1} está dominado por {fs_nombre} ({pct:.0f}%). "
-            )
+        # Tabla cluster × feedstock con un solo bincount sobre índices combinados
+        fs_min = int(session.feedstock.min())
+        fs_codigos = session.feedstock.astype(np.intp) - fs_min
+        n_fs = int(fs_codigos.max()) + 1
+        n_filas = int(unique[-1]) + 1
+        tabla = np.bincount(
+            labels * n_fs + fs_codigos, minlength=n_filas * n_fs
+        ).reshape(n_filas, n_fs)
+        tabla = tabla[unique]
+        fs_principales = (tabla.argmax(axis=1) + fs_min).tolist()
+        pcts = (tabla.max(axis=1) / counts * 100).tolist()
+        texto_feedstock = "\n\nRelación con feedstock: " + "".join(
+            f"Grupo {cluster_id + 1} está dominado por "
+            f"{_FEEDSTOCK_NOMBRES[fs] if 0 <= fs < len(_FEEDSTOCK_NOMBRES) else f'Tipo {fs}'} ({pct:.0f}%). "
+            for cluster_id, fs, pct in zip(unique.tolist(), fs_principales, pcts)
+        )
 
-    return "".join(interpretacion)
+    return (
+        f"Se identificaron {n_clusters} grupos (clusters) en los datos usando el método "
+        f"{session.cluster_metodo or 'K-means'}. "
+        f"{texto_distribucion}{texto_feedstock}"
+    )
 
 
-def generar_interpretacion_diagnosticos(session_id: str) -> Optional[str]:
-    """Genera interpretación textual de los diagnósticos PCA"""
-    try:
-        diagnosticos = pca_service.calcular_diagnosticos_pca(session_id)
-    except Exception:
-        return None
+def generar_interpretacion_diagnosticos(
+    session_id: str,
+    *,
+    diagnosticos: Optional[Dict[str, Any]] = None
+) -> Optional[str]:
+    """
+    Genera interpretación textual de los diagnósticos PCA.
+
+    diagnosticos: resultado de calcular_diagnosticos_pca, si el llamador ya lo obtuvo.
+    """
+    if diagnosticos is None:
+        try:
+            diagnosticos = pca_service.calcular_diagnosticos_pca(session_id)
+        except Exception:
+            # Sesión inexistente, sin PCA o fallo numérico: sin interpretación
+            return None
 
     n_muestras = diagnosticos["n_muestras"]
     n_outliers_t2 = diagnosticos["estadisticas"]["n_outliers_t2"]
@@ -145,77 +233,62 @@ def generar_interpretacion_diagnosticos(session_id: str) -> Optional[str]:
     pct_q = (n_outliers_q / n_muestras) * 100
     pct_comb = (n_outliers_comb / n_muestras) * 100
 
-    interpretacion = []
-    interpretacion.append(
+    texto_combinados = (
+        f" De estas, {n_outliers_comb} muestras ({pct_comb:.1f}%) exceden ambos límites "
+        f"simultáneamente, lo que indica posibles muestras problemáticas o especiales "
+        f"que merecen revisión manual."
+    ) if n_outliers_comb > 0 else (
+        " No se encontraron muestras que excedan ambos límites simultáneamente, "
+        "lo cual sugiere buena calidad general del modelo PCA."
+    )
+
+    return (
         f"El análisis de diagnósticos identificó {n_outliers_t2} muestras ({pct_t2:.1f}%) "
         f"con valores anómalos de T² (Hotelling) y {n_outliers_q} muestras ({pct_q:.1f}%) "
-        f"con altos residuales Q."
+        f"con altos residuales Q.{texto_combinados}"
     )
 
-    if n_outliers_comb > 0:
-        interpretacion.append(
-            f" De estas, {n_outliers_comb} muestras ({pct_comb:.1f}%) exceden ambos límites "
-            f"simultáneamente, lo que indica posibles muestras problemáticas o especiales "
-            f"que merecen revisión manual."
-        )
-    else:
-        interpretacion.append(
-            " No se encontraron muestras que excedan ambos límites simultáneamente, "
-            "lo cual sugiere buena calidad general del modelo PCA."
-        )
-
-    return "".join(interpretacion)
-
 
 def generar_interpretacion_clasificador(session) -> Optional[str]:
     """Genera interpretación textual de los clasificadores"""
-    interpretaciones = []
-
+    texto_feedstock = ""
     if session.classifier_feedstock is not None:
         clf = session.classifier_feedstock
-        interpretaciones.append(
-            f"Clasificador de Feedstock ({clf.modelo_tipo}): "
-            f"Accuracy = {clf.accuracy*100:.1f}%, F1-Score = {clf.f1_score*100:.1f}%. "
-        )
         if clf.accuracy > 0.9:
-            interpretaciones.append(
-                "El modelo tiene excelente capacidad para identificar la materia prima. "
-            )
+            valoracion = "El modelo tiene excelente capacidad para identificar la materia prima. "
         elif clf.accuracy > 0.7:
-            interpretaciones.append(
-                "El modelo tiene buena capacidad predictiva, aunque hay cierta confusión entre clases. "
-            )
+            valoracion = "El modelo tiene buena capacidad predictiva, aunque hay cierta confusión entre clases. "
         else:
-            interpretaciones.append(
-                "El modelo tiene capacidad predictiva limitada. Considere más datos o features. "
-            )
+            valoracion = "El modelo tiene capacidad predictiva limitada. Considere más datos o features. "
+        texto_feedstock = (
+            f"Clasificador de Feedstock ({clf.modelo_tipo}): "
+            f"Accuracy = {clf.accuracy*100:.1f}%, F1-Score = {clf.f1_score*100:.1f}%. {valoracion}"
+        )
 
+    texto_concentracion = ""
     if session.classifier_concentration is not None:
         clf = session.classifier_concentration
-        interpretaciones.append(
-            f"\n\nClasificador de Concentración ({clf.modelo_tipo}): "
-            f"Accuracy = {clf.accuracy*100:.1f}%, F1-Score = {clf.f1_score*100:.1f}%. "
-        )
         if clf.accuracy > 0.9:
-            interpretaciones.append(
-                "El modelo predice muy bien los niveles de biodiesel."
-            )
+            valoracion = "El modelo predice muy bien los niveles de biodiesel."
         elif clf.accuracy > 0.7:
-            interpretaciones.append(
-                "El modelo distingue razonablemente bien las concentraciones."
-            )
+            valoracion = "El modelo distingue razonablemente bien las concentraciones."
         else:
-            interpretaciones.append(
-                "Predecir la concentración exacta es difícil con estos datos."
-            )
+            valoracion = "Predecir la concentración exacta es difícil con estos datos."
+        texto_concentracion = (
+            f"\n\nClasificador de Concentración ({clf.modelo_tipo}): "
+            f"Accuracy = {clf.accuracy*100:.1f}%, F1-Score = {clf.f1_score*100:.1f}%. {valoracion}"
+        )
 
-    return "".join(interpretaciones) if interpretaciones else None
+    return f"{texto_feedstock}{texto_concentracion}" or None
 
 
 def generar_resumen(session_id: str) -> Dict[str, Any]:
     """
     Genera un resumen completo del análisis para el reporte.
 
+    El resultado se reutiliza mientras la sesión no cambie (misma
+    version_analisis), p. ej. al descargar el PDF tras ver el resumen.
+
     Returns:
         Diccionario con toda la información del reporte
     """
@@ -223,6 +296,16 @@ def generar_resumen(session_id: str) -> Dict[str, Any]:
     if not session:
         raise ValueError("Sesión no encontrada")
 
+    # Caché en la propia sesión: se descarta junto con ella
+    if session.resumen_cache is not None and session.resumen_cache[0] == session.version_analisis:
+        return session.resumen_cache[1]
+    resumen = _construir_resumen(session_id, session)
+    session.resumen_cache = (session.version_analisis, resumen)
+    return resumen
+
+
+def _construir_resumen(session_id: str, session) -> Dict[str, Any]:
+    """Construye el resumen del análisis (sin caché)."""
     # Información del dataset
     info_dataset = {
         "n_muestras": len(session.df_original) if session.df_original is not None else 0,
@@ -236,42 +319,41 @@ def generar_resumen(session_id: str) -> Dict[str, Any]:
     # Resumen de PCA
     pca_resumen = None
     if session.pca_varianza is not None:
-        varianza = session.pca_varianza * 100
-        var_acumulada = np.cumsum(varianza)
+        varianza = session.pca_varianza_pct
+        var_acumulada = session.pca_var_acumulada
 
         # Componentes importantes (varianza > 5%)
-        componentes_imp = []
-        for i, var in enumerate(varianza):
-            if var >= 5:
-                componentes_imp.append({
-                    "nombre": f"PC{i+1}",
-                    "varianza": float(var),
-                    "acumulada": float(var_acumulada[i])
-                })
+        idx_imp = np.flatnonzero(varianza >= 5)
+        componentes_imp = [
+            {"nombre": f"PC{i+1}", "varianza": var, "acumulada": acumulada}
+            for i, var, acumulada in zip(
+                idx_imp.tolist(),
+                varianza[idx_imp].tolist(),
+                var_acumulada[idx_imp].tolist()
+            )
+        ]
 
         # Top loadings
         top_loadings_pc1 = []
         top_loadings_pc2 = []
-        if session.pca_loadings is not None and len(session.columnas_seleccionadas) > 0:
+        variables = session.columnas_seleccionadas
+        if session.pca_loadings is not None and len(variables) > 0:
             loadings = session.pca_loadings
-            variables = session.columnas_seleccionadas
 
-            # PC1
-            sorted_idx = np.argsort(np.abs(loadings[:, 0]))[::-1][:3]
-            for idx in sorted_idx:
-                top_loadings_pc1.append({
-                    "variable": variables[idx],
-                    "loading": float(loadings[idx, 0])
-                })
+            # PC1 (solo los k seleccionados se convierten a floats de Python)
+            idx = _top_indices_abs(loadings[:, 0])
+            top_loadings_pc1 = [
+                {"variable": variables[i], "loading": valor}
+                for i, valor in zip(idx.tolist(), loadings[idx, 0].tolist())
+            ]
 
             # PC2 si existe
             if loadings.shape[1] > 1:
-                sorted_idx = np.argsort(np.abs(loadings[:, 1]))[::-1][:3]
-                for idx in sorted_idx:
-                    top_loadings_pc2.append({
-                        "variable": variables[idx],
-                        "loading": float(loadings[idx, 1])
-                    })
+                idx = _top_indices_abs(loadings[:, 1])
+                top_loadings_pc2 = [
+                    {"variable": variables[i], "loading": valor}
+                    for i, valor in zip(idx.tolist(), loadings[idx, 1].tolist())
+                ]
 
         pca_resumen = {
             "n_componentes": len(varianza),
@@ -283,17 +365,18 @@ def generar_resumen(session_id: str) -> Dict[str, Any]:
 
     # Resumen de clustering
     clustering_resumen = None
+    distribucion = None
     if session.cluster_labels is not None:
-        labels = session.cluster_labels
-        unique, counts = np.unique(labels, return_counts=True)
-
-        estadisticas = []
-        for cluster_id, count in zip(unique, counts):
-            estadisticas.append({
-                "cluster_id": int(cluster_id),
-                "tamano": int(count),
-                "porcentaje": float(count / len(labels) * 100)
-            })
+        # Compartida con generar_interpretacion_clustering
+        distribucion = _distribucion_clusters(session.cluster_labels)
+        unique, counts, porcentajes = distribucion
+
+        estadisticas = [
+            {"cluster_id": cluster_id, "tamano": tamano, "porcentaje": porcentaje}
+            for cluster_id, tamano, porcentaje in zip(
+                unique.tolist(), counts.tolist(), porcentajes.tolist()
+            )
+        ]
 
         clustering_resumen = {
             "metodo": session.cluster_metodo or "kmeans",
@@ -309,8 +392,8 @@ def generar_resumen(session_id: str) -> Dict[str, Any]:
         classifier_resumen.append({
             "target": "feedstock",
             "modelo": clf.modelo_tipo,
-            "accuracy": float(clf.accuracy),
-            "f1_score": float(clf.f1_score),
+            "accuracy": clf.accuracy,
+            "f1_score": clf.f1_score,
             "mejores_variables": clf.feature_names[:3] if clf.feature_names else []
         })
 
@@ -319,35 +402,36 @@ def generar_resumen(session_id: str) -> Dict[str, Any]:
         classifier_resumen.append({
             "target": "concentration",
             "modelo": clf.modelo_tipo,
-            "accuracy": float(clf.accuracy),
-            "f1_score": float(clf.f1_score),
+            "accuracy": clf.accuracy,
+            "f1_score": clf.f1_score,
             "mejores_variables": clf.feature_names[:3] if clf.feature_names else []
         })
 
-    # Resumen de diagnósticos PCA
+    # Resumen de diagnósticos PCA: sin PCA el helper retorna None sin lanzar;
+    # un fallo numérico en T²/Q no debe impedir el resto del resumen
+    try:
+        diagnosticos = pca_service.calcular_diagnosticos_pca_if_ready(session_id)
+    except Exception:
+        diagnosticos = None
     diagnosticos_resumen = None
-    if session.pca_scores is not None:
-        try:
-            diagnosticos = pca_service.calcular_diagnosticos_pca(session_id)
-            n_muestras = diagnosticos["n_muestras"]
-            diagnosticos_resumen = {
-                "n_outliers_t2": diagnosticos["estadisticas"]["n_outliers_t2"],
-                "n_outliers_q": diagnosticos["estadisticas"]["n_outliers_q"],
-                "n_outliers_combinados": diagnosticos["estadisticas"]["n_outliers_combinados"],
-                "t2_limit_95": diagnosticos["t2_limit_95"],
-                "q_limit_95": diagnosticos["q_limit_95"],
-                "t2_media": diagnosticos["estadisticas"]["t2_media"],
-                "q_media": diagnosticos["estadisticas"]["q_media"],
-                "porcentaje_outliers": (diagnosticos["estadisticas"]["n_outliers_combinados"] / n_muestras) * 100
-            }
-        except Exception:
-            pass
+    if diagnosticos is not None:
+        n_muestras = diagnosticos["n_muestras"]
+        diagnosticos_resumen = {
+            "n_outliers_t2": diagnosticos["estadisticas"]["n_outliers_t2"],
+            "n_outliers_q": diagnosticos["estadisticas"]["n_outliers_q"],
+            "n_outliers_combinados": diagnosticos["estadisticas"]["n_outliers_combinados"],
+            "t2_limit_95": diagnosticos["t2_limit_95"],
+            "q_limit_95": diagnosticos["q_limit_95"],
+            "t2_media": diagnosticos["estadisticas"]["t2_media"],
+            "q_media": diagnosticos["estadisticas"]["q_media"],
+            "porcentaje_outliers": (diagnosticos["estadisticas"]["n_outliers_combinados"] / n_muestras) * 100
+        }
 
     # Resumen de auto-optimización
     optimizacion_resumen = None
     if session.X_procesado is not None:
         try:
-            optimizacion = pca_service.calcular_optimizacion_pcs(session_id)
+            optimizacion = pca_service.calcular_optimizacion_pcs(session_id, incluir_errores=False)
             optimizacion_resumen = {
                 "componentes_recomendados": optimizacion["componentes_recomendados"],
                 "varianza_recomendada": optimizacion["varianza_recomendada"],
@@ -366,15 +450,9 @@ def generar_resumen(session_id: str) -> Dict[str, Any]:
         tiene_3d = n_componentes >= 3
         varianza_3d = None
         if tiene_3d and session.pca_varianza is not None:
-            varianza_3d = float(sum(session.pca_varianza[:3]) * 100)
+            varianza_3d = float(session.pca_varianza_pct[:3].sum())
 
-        metodos_disponibles = ["PCA"]
-        try:
-            import umap
-            metodos_disponibles.append("UMAP")
-        except ImportError:
-            pass
-        metodos_disponibles.append("t-SNE")
+        metodos_disponibles = ["PCA", "UMAP", "t-SNE"] if UMAP_AVAILABLE else ["PCA", "t-SNE"]
 
         visualizacion_resumen = {
             "tiene_3d": tiene_3d,
@@ -382,40 +460,25 @@ def generar_resumen(session_id: str) -> Dict[str, Any]:
             "metodos_disponibles": metodos_disponibles
         }
 
-    # Interpretaciones
-    interpretacion_general = (
+    # Interpretación general: una frase por cada análisis disponible
+    interpretacion_general = "".join((
         f"Este análisis quimiométrico procesó {info_dataset['n_muestras']} muestras "
-        f"con {len(session.columnas_seleccionadas)} variables químicas (perfiles de FAMEs). "
-    )
-
-    if pca_resumen:
-        interpretacion_general += (
-            f"El análisis de componentes principales (PCA) redujo la dimensionalidad "
-            f"a {pca_resumen['n_componentes']} componentes, capturando "
-            f"{pca_resumen['varianza_total']:.1f}% de la varianza total. "
-        )
-
-    if clustering_resumen:
-        interpretacion_general += (
-            f"El clustering identificó {clustering_resumen['n_clusters']} grupos naturales en los datos. "
-        )
-
-    if classifier_resumen:
-        interpretacion_general += (
-            f"Se entrenaron {len(classifier_resumen)} clasificadores supervisados para predicción. "
-        )
-
-    if diagnosticos_resumen:
-        interpretacion_general += (
-            f"Los diagnósticos identificaron {diagnosticos_resumen['n_outliers_combinados']} "
-            f"posibles outliers ({diagnosticos_resumen['porcentaje_outliers']:.1f}%). "
-        )
-
-    if optimizacion_resumen:
-        interpretacion_general += (
-            f"El análisis recomienda usar {optimizacion_resumen['componentes_recomendados']} "
-            f"componentes principales ({optimizacion_resumen['varianza_recomendada']:.1f}% varianza). "
-        )
+        f"con {len(session.columnas_seleccionadas)} variables químicas (perfiles de FAMEs). ",
+        f"El análisis de componentes principales (PCA) redujo la dimensionalidad "
+        f"a {pca_resumen['n_componentes']} componentes, capturando "
+        f"{pca_resumen['varianza_total']:.1f}% de la varianza total. "
+        if pca_resumen else "",
+        f"El clustering identificó {clustering_resumen['n_clusters']} grupos naturales en los datos. "
+        if clustering_resumen else "",
+        f"Se entrenaron {len(classifier_resumen)} clasificadores supervisados para predicción. "
+        if classifier_resumen else "",
+        f"Los diagnósticos identificaron {diagnosticos_resumen['n_outliers_combinados']} "
+        f"posibles outliers ({diagnosticos_resumen['porcentaje_outliers']:.1f}%). "
+        if diagnosticos_resumen else "",
+        f"El análisis recomienda usar {optimizacion_resumen['componentes_recomendados']} "
+        f"componentes principales ({optimizacion_resumen['varianza_recomendada']:.1f}% varianza). "
+        if optimizacion_resumen else "",
+    ))
 
     return {
         "info_dataset": info_dataset,
@@ -427,96 +490,167 @@ def generar_resumen(session_id: str) -> Dict[str, Any]:
         "classifier_resumen": classifier_resumen if classifier_resumen else None,
         "interpretacion_general": interpretacion_general,
         "interpretacion_pca": generar_interpretacion_pca(session),
-        "interpretacion_diagnosticos": generar_interpretacion_diagnosticos(session_id),
-        "interpretacion_clustering": generar_interpretacion_clustering(session),
+        "interpretacion_diagnosticos": (
+            generar_interpretacion_diagnosticos(session_id, diagnosticos=diagnosticos)
+            if diagnosticos_resumen else None
+        ),
+        "interpretacion_clustering": generar_interpretacion_clustering(session, distribucion=distribucion),
         "interpretacion_clasificador": generar_interpretacion_clasificador(session)
     }
 
 
+# Ampersands y saltos de línea a marcado de ReportLab, en una sola pasada
+# ("\n\n" antes que "\n" en la alternancia)
+_PDF_ESCAPE_RE = re.compile(r"&|\n\n|\n")
+_PDF_ESCAPE_MAP = {"&": "&amp;", "\n\n": "<br/><br/>", "\n": "<br/>"}
+
+
 def _preparar_texto_pdf(texto: str) -> str:
     """Prepara texto para ReportLab: escapa caracteres y convierte saltos de línea"""
     if texto is None:
         return ""
-    # Convertir saltos de línea a tags HTML para ReportLab
-    texto = str(texto).replace("\n\n", "<br/><br/>").replace("\n", "<br/>")
-    # Escapar ampersands que no sean parte de entidades HTML
-    texto = texto.replace("&", "&amp;")
-    return texto
+    return _PDF_ESCAPE_RE.sub(lambda m: _PDF_ESCAPE_MAP[m.group(0)], str(texto))
 
 
-def generar_pdf(session_id: str) -> bytes:
-    """
-    Genera un PDF con el reporte completo.
+# Símbolos de ReportLab, importados en el primer PDF generado (ver _cargar_reportlab)
+_reportlab: Optional[SimpleNamespace] = None
 
-    Returns:
-        Bytes del archivo PDF
+
+def _cargar_reportlab() -> SimpleNamespace:
     """
-    try:
-        from reportlab.lib import colors
-        from reportlab.lib.pagesizes import letter, A4
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.units import inch, cm
-        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-        from reportlab.platypus import PageBreak
-    except ImportError:
-        raise ImportError(
-            "ReportLab no está instalado. Ejecuta: pip install reportlab"
+    Importa ReportLab una sola vez y guarda los símbolos usados por generar_pdf.
+    La importación se difiere al primer PDF para no cargar ReportLab al iniciar la API.
+    """
+    global _reportlab
+    if _reportlab is None:
+        try:
+            from reportlab.lib import colors
+            from reportlab.lib.pagesizes import A4
+            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+            from reportlab.lib.units import cm
+            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+        except ImportError:
+            raise ImportError(
+                "ReportLab no está instalado. Ejecuta: pip install reportlab"
+            )
+
+        _reportlab = SimpleNamespace(
+            colors=colors, A4=A4, cm=cm,
+            getSampleStyleSheet=getSampleStyleSheet, ParagraphStyle=ParagraphStyle,
+            SimpleDocTemplate=SimpleDocTemplate, Paragraph=Paragraph, Spacer=Spacer,
+            Table=Table, TableStyle=TableStyle
         )
+    return _reportlab
 
-    session = store.obtener_sesion(session_id)
-    if not session:
-        raise ValueError("Sesión no encontrada")
 
-    resumen = generar_resumen(session_id)
+def _espacio(rl: SimpleNamespace, alto: float):
+    """
+    Espaciador vertical de `alto` puntos. Se crea uno por uso: Platypus guarda
+    estado de maquetación en cada flowable, así que no se comparten instancias.
+    """
+    return rl.Spacer(1, alto)
 
-    # Crear PDF en memoria
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        rightMargin=2*cm,
-        leftMargin=2*cm,
-        topMargin=2*cm,
-        bottomMargin=2*cm
-    )
 
-    # Estilos
-    styles = getSampleStyleSheet()
-    titulo_style = ParagraphStyle(
-        'Titulo',
-        parent=styles['Heading1'],
-        fontSize=18,
-        spaceAfter=20,
-        alignment=1  # Centrado
-    )
-    subtitulo_style = ParagraphStyle(
-        'Subtitulo',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceBefore=15,
-        spaceAfter=10
-    )
-    normal_style = ParagraphStyle(
-        'Normal',
-        parent=styles['Normal'],
-        fontSize=11,
-        spaceAfter=8,
-        leading=14
-    )
+# Estilos de párrafo y tabla del PDF (ver _obtener_estilos_pdf)
+_estilos_pdf: Optional[Dict[str, Any]] = None
 
-    # Contenido del documento
-    elementos = []
 
-    # Título
-    elementos.append(Paragraph("Reporte de Análisis Quimiométrico", titulo_style))
-    elementos.append(Paragraph(
-        f"Generado: {datetime.now().strftime('%d/%m/%Y %H:%M')}",
-        ParagraphStyle('Fecha', parent=styles['Normal'], fontSize=10, alignment=1)
-    ))
-    elementos.append(Spacer(1, 20))
+def _obtener_estilos_pdf() -> Dict[str, Any]:
+    """
+    Construye una sola vez los ParagraphStyle y TableStyle del reporte.
+    Son de solo lectura para ReportLab, así que se comparten entre PDFs.
+    """
+    global _estilos_pdf
+    if _estilos_pdf is None:
+        rl = _cargar_reportlab()
+        colors = rl.colors
+        styles = rl.getSampleStyleSheet()
+
+        def encabezado(color: str):
+            return rl.TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(color)),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+                ('PADDING', (0, 0), (-1, -1), 6),
+            ])
 
-    # Información del dataset
-    elementos.append(Paragraph("1. Información del Dataset", subtitulo_style))
+        _estilos_pdf = {
+            "titulo": rl.ParagraphStyle(
+                'Titulo',
+                parent=styles['Heading1'],
+                fontSize=18,
+                spaceAfter=20,
+                alignment=1  # Centrado
+            ),
+            "subtitulo": rl.ParagraphStyle(
+                'Subtitulo',
+                parent=styles['Heading2'],
+                fontSize=14,
+                spaceBefore=15,
+                spaceAfter=10
+            ),
+            "normal": rl.ParagraphStyle(
+                'Normal',
+                parent=styles['Normal'],
+                fontSize=11,
+                spaceAfter=8,
+                leading=14
+            ),
+            "fecha": rl.ParagraphStyle('Fecha', parent=styles['Normal'], fontSize=10, alignment=1),
+            "pie": rl.ParagraphStyle('Pie', parent=styles['Normal'], fontSize=9, textColor=colors.grey, alignment=1),
+            "tabla_info": rl.TableStyle([
+                ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+                ('PADDING', (0, 0), (-1, -1), 8),
+            ]),
+            "tabla_azul": encabezado('#0658a6'),
+            "tabla_roja": encabezado('#dc2626'),
+            "tabla_verde": encabezado('#059669'),
+        }
+    return _estilos_pdf
+
+
+class _DestinoPDF:
+    """
+    Destino de escritura para ReportLab que conserva los bytes emitidos sin
+    copiarlos. ReportLab serializa el documento completo y lo escribe en una
+    sola llamada a write(), así que un BytesIO solo añadiría una copia al
+    escribir y otra en getvalue().
+    """
+
+    def __init__(self):
+        self._partes: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._partes.append(data)
+        return len(data)
+
+    def getvalue(self) -> bytes:
+        if len(self._partes) == 1:
+            return self._partes[0]
+        return b"".join(self._partes)
+
+
+# =============================================================================
+# SECCIONES DEL PDF
+# =============================================================================
+# Cada sección recibe el resumen, su número, los símbolos de ReportLab y los
+# estilos, y devuelve sus flowables. Solo se invocan si hay datos para ellas.
+
+def _pdf_tabla(rl, datos: list, anchos_cm: Tuple[float, ...], estilo) -> Any:
+    """Tabla con anchos de columna en cm y uno de los TableStyle compartidos"""
+    return rl.Table(datos, colWidths=[a * rl.cm for a in anchos_cm], style=estilo)
+
+
+def _pdf_interpretacion(texto: Optional[str], espacio: int, rl, estilo) -> list:
+    """Párrafo de interpretación precedido de un espacio, o nada si no hay texto"""
+    if not texto:
+        return []
+    return [_espacio(rl, espacio), rl.Paragraph(_preparar_texto_pdf(texto), estilo)]
+
+
+def _pdf_seccion_info(resumen: Dict[str, Any], numero: int, rl, estilos) -> list:
+    """Información del dataset"""
     info = resumen["info_dataset"]
     tabla_info = [
         ["Número de muestras", str(info["n_muestras"])],
@@ -524,192 +658,244 @@ def generar_pdf(session_id: str) -> bytes:
         ["Variables categóricas", str(info["n_variables_categoricas"])],
         ["Variables analizadas", str(len(info["variables_seleccionadas"]))],
     ]
-    t = Table(tabla_info, colWidths=[8*cm, 6*cm])
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('PADDING', (0, 0), (-1, -1), 8),
-    ]))
-    elementos.append(t)
-    elementos.append(Spacer(1, 10))
-
-    # PCA
-    if resumen["pca_resumen"]:
-        elementos.append(Paragraph("2. Análisis de Componentes Principales (PCA)", subtitulo_style))
-        pca = resumen["pca_resumen"]
-        elementos.append(Paragraph(
+    t = _pdf_tabla(rl, tabla_info, (8, 6), estilos["tabla_info"])
+    return [
+        rl.Paragraph(f"{numero}. Información del Dataset", estilos["subtitulo"]),
+        t,
+        _espacio(rl, 10)
+    ]
+
+
+def _pdf_seccion_pca(resumen: Dict[str, Any], numero: int, rl, estilos) -> list:
+    """Análisis de componentes principales"""
+    normal_style = estilos["normal"]
+    pca = resumen["pca_resumen"]
+    elementos = [
+        rl.Paragraph(f"{numero}. Análisis de Componentes Principales (PCA)", estilos["subtitulo"]),
+        rl.Paragraph(
             f"Se calcularon {pca['n_componentes']} componentes principales, "
             f"capturando {pca['varianza_total']:.1f}% de la varianza total.",
             normal_style
-        ))
-
-        if pca["componentes_importantes"]:
-            tabla_pca = [["Componente", "Varianza (%)", "Acumulada (%)"]]
-            for comp in pca["componentes_importantes"]:
-                tabla_pca.append([
-                    comp["nombre"],
-                    f"{comp['varianza']:.1f}",
-                    f"{comp['acumulada']:.1f}"
-                ])
-            t = Table(tabla_pca, colWidths=[5*cm, 4*cm, 4*cm])
-            t.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0658a6')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('PADDING', (0, 0), (-1, -1), 6),
-            ]))
-            elementos.append(t)
-
-        if resumen.get("interpretacion_pca"):
-            elementos.append(Spacer(1, 10))
-            elementos.append(Paragraph(_preparar_texto_pdf(resumen["interpretacion_pca"]), normal_style))
+        )
+    ]
 
-    # Diagnósticos PCA
-    section_num = 3
-    if resumen.get("diagnosticos_resumen"):
-        elementos.append(Paragraph(f"{section_num}. Diagnósticos PCA (Hotelling T² y Q-residuales)", subtitulo_style))
-        diag = resumen["diagnosticos_resumen"]
-
-        tabla_diag = [
-            ["Métrica", "Media", "Límite 95%", "Outliers"],
-            ["Hotelling T²", f"{diag['t2_media']:.2f}", f"{diag['t2_limit_95']:.2f}", str(diag['n_outliers_t2'])],
-            ["Q-residuales", f"{diag['q_media']:.4f}", f"{diag['q_limit_95']:.4f}", str(diag['n_outliers_q'])],
-        ]
-        t = Table(tabla_diag, colWidths=[4*cm, 3*cm, 3*cm, 3*cm])
-        t.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#dc2626')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('PADDING', (0, 0), (-1, -1), 6),
-        ]))
+    comps = pca["componentes_importantes"]
+    if comps:
+        # Columnas formateadas de una vez y unidas en filas con zip
+        nombres = [c["nombre"] for c in comps]
+        varianzas = [f"{c['varianza']:.1f}" for c in comps]
+        acumuladas = [f"{c['acumulada']:.1f}" for c in comps]
+        tabla_pca = [["Componente", "Varianza (%)", "Acumulada (%)"]]
+        tabla_pca += map(list, zip(nombres, varianzas, acumuladas))
+        t = _pdf_tabla(rl, tabla_pca, (5, 4, 4), estilos["tabla_azul"])
         elementos.append(t)
 
-        elementos.append(Spacer(1, 5))
-        elementos.append(Paragraph(
+    elementos += _pdf_interpretacion(resumen.get("interpretacion_pca"), 10, rl, normal_style)
+
+    return elementos
+
+
+def _pdf_seccion_diagnosticos(resumen: Dict[str, Any], numero: int, rl, estilos) -> list:
+    """Diagnósticos PCA (T² y Q)"""
+    normal_style = estilos["normal"]
+    diag = resumen["diagnosticos_resumen"]
+
+    tabla_diag = [
+        ["Métrica", "Media", "Límite 95%", "Outliers"],
+        ["Hotelling T²", f"{diag['t2_media']:.2f}", f"{diag['t2_limit_95']:.2f}", str(diag['n_outliers_t2'])],
+        ["Q-residuales", f"{diag['q_media']:.4f}", f"{diag['q_limit_95']:.4f}", str(diag['n_outliers_q'])],
+    ]
+    t = _pdf_tabla(rl, tabla_diag, (4, 3, 3, 3), estilos["tabla_roja"])
+
+    elementos = [
+        rl.Paragraph(f"{numero}. Diagnósticos PCA (Hotelling T² y Q-residuales)", estilos["subtitulo"]),
+        t,
+        _espacio(rl, 5),
+        rl.Paragraph(
             f"Outliers combinados (T² y Q): {diag['n_outliers_combinados']} muestras ({diag['porcentaje_outliers']:.1f}%)",
             normal_style
-        ))
+        )
+    ]
+
+    elementos += _pdf_interpretacion(resumen.get("interpretacion_diagnosticos"), 5, rl, normal_style)
 
-        if resumen.get("interpretacion_diagnosticos"):
-            elementos.append(Spacer(1, 5))
-            elementos.append(Paragraph(_preparar_texto_pdf(resumen["interpretacion_diagnosticos"]), normal_style))
+    return elementos
 
-        section_num += 1
 
-    # Auto-Optimización
-    if resumen.get("optimizacion_resumen"):
-        elementos.append(Paragraph(f"{section_num}. Auto-Optimización de Componentes", subtitulo_style))
-        opt = resumen["optimizacion_resumen"]
+def _pdf_seccion_optimizacion(resumen: Dict[str, Any], numero: int, rl, estilos) -> list:
+    """Auto-optimización del número de componentes"""
+    normal_style = estilos["normal"]
+    opt = resumen["optimizacion_resumen"]
+
+    tabla_opt = [
+        ["Criterio", "k Recomendado"],
+        ["Por varianza (90%)", str(opt['k_por_varianza'])],
+        ["Método del codo", str(opt['k_por_codo'])],
+        ["Por significancia", str(opt['k_por_significancia'])],
+    ]
+    t = _pdf_tabla(rl, tabla_opt, (7, 4), estilos["tabla_verde"])
 
-        elementos.append(Paragraph(
+    return [
+        rl.Paragraph(f"{numero}. Auto-Optimización de Componentes", estilos["subtitulo"]),
+        rl.Paragraph(
             f"Recomendación: <b>{opt['componentes_recomendados']} componentes principales</b> "
             f"({opt['varianza_recomendada']:.1f}% varianza explicada)",
             normal_style
-        ))
-        elementos.append(Paragraph(f"Motivo: {opt['motivo_recomendacion']}", normal_style))
-
-        tabla_opt = [
-            ["Criterio", "k Recomendado"],
-            ["Por varianza (90%)", str(opt['k_por_varianza'])],
-            ["Método del codo", str(opt['k_por_codo'])],
-            ["Por significancia", str(opt['k_por_significancia'])],
-        ]
-        t = Table(tabla_opt, colWidths=[7*cm, 4*cm])
-        t.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#059669')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('PADDING', (0, 0), (-1, -1), 6),
-        ]))
-        elementos.append(t)
-        section_num += 1
+        ),
+        rl.Paragraph(f"Motivo: {opt['motivo_recomendacion']}", normal_style),
+        t
+    ]
 
-    # Visualización Avanzada
-    if resumen.get("visualizacion_resumen"):
-        elementos.append(Paragraph(f"{section_num}. Visualización Avanzada", subtitulo_style))
-        vis = resumen["visualizacion_resumen"]
 
-        vis_texto = f"Métodos de reducción disponibles: {', '.join(vis['metodos_disponibles'])}. "
-        if vis['tiene_3d']:
-            vis_texto += f"Visualización 3D disponible con {vis['varianza_3d']:.1f}% de varianza explicada (PC1+PC2+PC3)."
-        else:
-            vis_texto += "Visualización 3D no disponible (se requieren al menos 3 componentes)."
+def _pdf_seccion_visualizacion(resumen: Dict[str, Any], numero: int, rl, estilos) -> list:
+    """Visualización avanzada (3D, UMAP, t-SNE)"""
+    vis = resumen["visualizacion_resumen"]
+
+    vis_texto = f"Métodos de reducción disponibles: {', '.join(vis['metodos_disponibles'])}. "
+    if vis['tiene_3d']:
+        vis_texto += f"Visualización 3D disponible con {vis['varianza_3d']:.1f}% de varianza explicada (PC1+PC2+PC3)."
+    else:
+        vis_texto += "Visualización 3D no disponible (se requieren al menos 3 componentes)."
+
+    return [
+        rl.Paragraph(f"{numero}. Visualización Avanzada", estilos["subtitulo"]),
+        rl.Paragraph(vis_texto, estilos["normal"])
+    ]
 
-        elementos.append(Paragraph(vis_texto, normal_style))
-        section_num += 1
 
-    # Clustering
-    if resumen["clustering_resumen"]:
-        elementos.append(Paragraph(f"{section_num}. Análisis de Clustering", subtitulo_style))
-        clust = resumen["clustering_resumen"]
-        section_num += 1
-        elementos.append(Paragraph(
+def _pdf_seccion_clustering(resumen: Dict[str, Any], numero: int, rl, estilos) -> list:
+    """Análisis de clustering"""
+    normal_style = estilos["normal"]
+    clust = resumen["clustering_resumen"]
+    elementos = [
+        rl.Paragraph(f"{numero}. Análisis de Clustering", estilos["subtitulo"]),
+        rl.Paragraph(
             f"Método: {clust['metodo'].upper()} | Clusters: {clust['n_clusters']}",
             normal_style
-        ))
-
-        if clust["estadisticas"]:
-            tabla_clust = [["Grupo", "Muestras", "Porcentaje"]]
-            for est in clust["estadisticas"]:
-                tabla_clust.append([
-                    f"Grupo {est['cluster_id'] + 1}",
-                    str(est["tamano"]),
-                    f"{est['porcentaje']:.1f}%"
-                ])
-            t = Table(tabla_clust, colWidths=[5*cm, 4*cm, 4*cm])
-            t.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0658a6')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('PADDING', (0, 0), (-1, -1), 6),
-            ]))
-            elementos.append(t)
-
-        if resumen.get("interpretacion_clustering"):
-            elementos.append(Spacer(1, 10))
-            elementos.append(Paragraph(_preparar_texto_pdf(resumen["interpretacion_clustering"]), normal_style))
-
-    # Clasificadores
-    if resumen["classifier_resumen"]:
-        elementos.append(Paragraph(f"{section_num}. Clasificadores Supervisados", subtitulo_style))
-        section_num += 1
-
-        tabla_clf = [["Target", "Modelo", "Accuracy", "F1-Score"]]
-        for clf in resumen["classifier_resumen"]:
-            tabla_clf.append([
-                clf["target"].capitalize(),
-                clf["modelo"],
-                f"{clf['accuracy']*100:.1f}%",
-                f"{clf['f1_score']*100:.1f}%"
-            ])
-        t = Table(tabla_clf, colWidths=[4*cm, 4*cm, 3*cm, 3*cm])
-        t.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0658a6')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('PADDING', (0, 0), (-1, -1), 6),
-        ]))
+        )
+    ]
+
+    stats = clust["estadisticas"]
+    if stats:
+        grupos = [f"Grupo {e['cluster_id'] + 1}" for e in stats]
+        tamanos = [str(e["tamano"]) for e in stats]
+        porcentajes = [f"{e['porcentaje']:.1f}%" for e in stats]
+        tabla_clust = [["Grupo", "Muestras", "Porcentaje"]]
+        tabla_clust += map(list, zip(grupos, tamanos, porcentajes))
+        t = _pdf_tabla(rl, tabla_clust, (5, 4, 4), estilos["tabla_azul"])
         elementos.append(t)
 
-        if resumen.get("interpretacion_clasificador"):
-            elementos.append(Spacer(1, 10))
-            elementos.append(Paragraph(_preparar_texto_pdf(resumen["interpretacion_clasificador"]), normal_style))
+    elementos += _pdf_interpretacion(resumen.get("interpretacion_clustering"), 10, rl, normal_style)
 
-    # Conclusiones
-    elementos.append(Paragraph(f"{section_num}. Resumen e Interpretacion General", subtitulo_style))
-    elementos.append(Paragraph(_preparar_texto_pdf(resumen["interpretacion_general"]), normal_style))
+    return elementos
 
-    # Pie de página
-    elementos.append(Spacer(1, 30))
-    elementos.append(Paragraph(
-        "Reporte generado por Chemometrics Helper - Tec de Monterrey",
-        ParagraphStyle('Pie', parent=styles['Normal'], fontSize=9, textColor=colors.grey, alignment=1)
-    ))
+
+def _pdf_seccion_clasificadores(resumen: Dict[str, Any], numero: int, rl, estilos) -> list:
+    """Clasificadores supervisados"""
+    clfs = resumen["classifier_resumen"]
+    targets = [c["target"].capitalize() for c in clfs]
+    modelos = [c["modelo"] for c in clfs]
+    accuracies = [f"{c['accuracy']*100:.1f}%" for c in clfs]
+    f1_scores = [f"{c['f1_score']*100:.1f}%" for c in clfs]
+    tabla_clf = [["Target", "Modelo", "Accuracy", "F1-Score"]]
+    tabla_clf += map(list, zip(targets, modelos, accuracies, f1_scores))
+    t = _pdf_tabla(rl, tabla_clf, (4, 4, 3, 3), estilos["tabla_azul"])
+
+    elementos = [
+        rl.Paragraph(f"{numero}. Clasificadores Supervisados", estilos["subtitulo"]),
+        t
+    ]
+
+    elementos += _pdf_interpretacion(resumen.get("interpretacion_clasificador"), 10, rl, estilos["normal"])
+
+    return elementos
+
+
+# Secciones con numeración correlativa a partir de la 3, en orden de aparición:
+# (constructor, clave del resumen que debe tener datos)
+SECCIONES_PDF = [
+    (_pdf_seccion_diagnosticos, "diagnosticos_resumen"),
+    (_pdf_seccion_optimizacion, "optimizacion_resumen"),
+    (_pdf_seccion_visualizacion, "visualizacion_resumen"),
+    (_pdf_seccion_clustering, "clustering_resumen"),
+    (_pdf_seccion_clasificadores, "classifier_resumen"),
+]
+
+
+def generar_pdf(session_id: str, output: Optional[BinaryIO] = None) -> Optional[bytes]:
+    """
+    Genera un PDF con el reporte completo.
+
+    Args:
+        session_id: ID de la sesión
+        output: Archivo binario donde escribir el PDF. Si se indica, el PDF
+            se escribe directamente en él y no se devuelven los bytes.
+
+    Returns:
+        Bytes del archivo PDF, o None si se escribió en output
+    """
+    rl = _cargar_reportlab()
+    cm = rl.cm
+
+    session = store.obtener_sesion(session_id)
+    if not session:
+        raise ValueError("Sesión no encontrada")
+
+    resumen = generar_resumen(session_id)
+
+    # Escribir en el destino recibido o, por defecto, en memoria
+    buffer = _DestinoPDF() if output is None else None
+    doc = rl.SimpleDocTemplate(
+        output if output is not None else buffer,
+        pagesize=rl.A4,
+        rightMargin=2*cm,
+        leftMargin=2*cm,
+        topMargin=2*cm,
+        bottomMargin=2*cm,
+        # Comprimir (zlib) los content streams: el reporte es casi todo texto
+        pageCompression=1
+    )
+
+    # Estilos (construidos una vez y compartidos entre reportes)
+    estilos = _obtener_estilos_pdf()
+
+    # Título
+    elementos = [
+        rl.Paragraph("Reporte de Análisis Quimiométrico", estilos["titulo"]),
+        rl.Paragraph(
+            f"Generado: {datetime.now().strftime('%d/%m/%Y %H:%M')}",
+            estilos["fecha"]
+        ),
+        _espacio(rl, 20)
+    ]
+
+    # Secciones fijas: dataset (1) y PCA (2, si existe)
+    elementos += _pdf_seccion_info(resumen, 1, rl, estilos)
+    if resumen["pca_resumen"]:
+        elementos += _pdf_seccion_pca(resumen, 2, rl, estilos)
+
+    # Secciones opcionales: solo se construyen las que tienen datos
+    section_num = 3
+    for construir_seccion, clave in SECCIONES_PDF:
+        if resumen.get(clave):
+            elementos += construir_seccion(resumen, section_num, rl, estilos)
+            section_num += 1
+
+    elementos += [
+        # Conclusiones
+        rl.Paragraph(f"{section_num}. Resumen e Interpretacion General", estilos["subtitulo"]),
+        rl.Paragraph(_preparar_texto_pdf(resumen["interpretacion_general"]), estilos["normal"]),
+        # Pie de página
+        _espacio(rl, 30),
+        rl.Paragraph(
+            "Reporte generado por Chemometrics Helper - Tec de Monterrey",
+            estilos["pie"]
+        )
+    ]
 
     # Construir PDF
     doc.build(elementos)
 
-    pdf_bytes = buffer.getvalue()
-    buffer.close()
-
-    return pdf_bytes
+    if output is not None:
+        return None
+    return buffer.getvalue()
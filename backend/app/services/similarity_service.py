@@ -4,12 +4,25 @@ Encuentra muestras similares basándose en perfiles de FAMEs
 """
 
 import numpy as np
-from typing import Dict, Any, Optional, List
-from scipy.spatial.distance import cdist
-from sklearn.metrics.pairwise import cosine_similarity
+from typing import Dict, Any, Optional, List, Tuple
+from scipy.spatial import cKDTree
 
 from app.services.store import store
 
+# Intentar importar numba (opcional) para el kernel de distancias
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# Intentar importar SimSIMD (opcional): kernels SIMD para distancias 1-a-N
+try:
+    import simsimd
+    SIMSIMD_AVAILABLE = True
+except ImportError:
+    SIMSIMD_AVAILABLE = False
+
 
 # Mapeos de etiquetas
 FEEDSTOCK_LABELS = {
@@ -33,32 +46,224 @@ CONCENTRATION_LABELS = {
 }
 
 
+# Hasta este número de muestras, las búsquedas de una muestra interna se
+# resuelven con un grafo de vecinos calculado una vez por espacio y métrica;
+# VECINOS_GRAFO cubre el k máximo de la API (20) más la propia muestra
+UMBRAL_GRAFO = 2_000
+VECINOS_GRAFO = 21
+
+# Búsquedas euclidianas en datasets grandes y de pocas dimensiones se resuelven
+# con un árbol KD cacheado; con más dimensiones el árbol pierde frente al barrido
+UMBRAL_KDTREE = 10_000
+DIM_MAX_KDTREE = 10
+
+# Filas de referencia por bloque al construir el grafo de vecinos
+# (bloque de distancias de 256 x N float64)
+BLOQUE_GRAFO = 256
+
+
+def _distancias_escalar(refs: np.ndarray, X: np.ndarray, coseno: bool, out: np.ndarray) -> np.ndarray:
+    """
+    Distancia euclidiana o coseno de cada referencia (fila de refs) a cada fila
+    de X, con una sola pasada por X: resta, producto y suma se fusionan por
+    par, sin temporales (N, d). Escribe en out (float64, m x N). Solo se usa
+    compilada con numba (paralela sobre las filas de X).
+    """
+    n, d = X.shape
+    m = refs.shape[0]
+    normas_ref = np.zeros(m)
+    if coseno:
+        for r in range(m):
+            norma_ref = 0.0
+            for j in range(d):
+                norma_ref += refs[r, j] * refs[r, j]
+            normas_ref[r] = np.sqrt(norma_ref)
+    for i in prange(n):
+        for r in range(m):
+            if coseno:
+                producto = 0.0
+                norma_x = 0.0
+                for j in range(d):
+                    x = X[i, j]
+                    producto += refs[r, j] * x
+                    norma_x += x * x
+                # Igual que cosine_similarity: un vector nulo tiene similitud 0
+                denominador = normas_ref[r] * np.sqrt(norma_x)
+                out[r, i] = 1.0 - (producto / denominador if denominador > 0.0 else 0.0)
+            else:
+                suma = 0.0
+                for j in range(d):
+                    dif = refs[r, j] - X[i, j]
+                    suma += dif * dif
+                out[r, i] = np.sqrt(suma)
+    return out
+
+
+_distancias_numba = (
+    njit(cache=True, parallel=True, fastmath=True)(_distancias_escalar) if NUMBA_AVAILABLE else None
+)
+
+
+def _vacio_alineado(shape, dtype=np.float64, alineacion: int = 64) -> np.ndarray:
+    """Array sin inicializar cuyo buffer empieza en una dirección múltiplo de alineacion"""
+    n_bytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    buf = np.empty(n_bytes + alineacion, dtype=np.uint8)
+    inicio = (-buf.ctypes.data) % alineacion
+    return buf[inicio:inicio + n_bytes].view(dtype).reshape(shape)
+
+
+def _derivado_cacheado(session, tipo: str, space: str, X_all: np.ndarray, calcular) -> np.ndarray:
+    """Derivado de X_all (grafo de vecinos, árbol KD), reutilizado mientras X_all no cambie"""
+    clave = (tipo, "pca" if space == "pca" else "original")
+    entrada = session.distancias_cache.get(clave)
+    if entrada is not None and entrada[0] is X_all:
+        return entrada[1]
+    derivado = calcular(X_all)
+    session.distancias_cache[clave] = (X_all, derivado)
+    return derivado
+
+
+def _buffer_distancias(session, n_samples: int) -> np.ndarray:
+    """
+    Buffer float64 de N distancias de la sesión, reutilizado entre consultas.
+    Los endpoints son async y se ejecutan de uno en uno en el event loop, y
+    los resultados se convierten a floats de Python antes de devolverse, así
+    que ninguna consulta conserva el buffer.
+    """
+    buf = session.distancias_buf
+    if buf is None or buf.shape[0] != n_samples:
+        buf = _vacio_alineado(n_samples)
+        session.distancias_buf = buf
+    return buf
+
+
 def calcular_distancias(
     X_ref: np.ndarray,
     X_all: np.ndarray,
-    metric: str = "euclidean"
+    metric: str = "euclidean",
+    out: Optional[np.ndarray] = None
 ) -> np.ndarray:
     """
     Calcula distancias entre una muestra de referencia y todas las demás.
 
     Args:
-        X_ref: Array de forma (1, n_features) con la muestra de referencia
+        X_ref: Array de forma (n_features,) con la muestra de referencia
         X_all: Array de forma (n_samples, n_features) con todas las muestras
         metric: 'euclidean' o 'cosine'
+        out: Buffer float64 de n_samples donde escribir las distancias;
+            si no se indica se crea uno nuevo
 
     Returns:
         Array de distancias
     """
-    if metric == "euclidean":
-        distances = cdist(X_ref.reshape(1, -1), X_all, metric='euclidean')[0]
-    elif metric == "cosine":
-        # Distancia coseno = 1 - similitud coseno
-        sim = cosine_similarity(X_ref.reshape(1, -1), X_all)[0]
-        distances = 1 - sim
-    else:
+    if out is None:
+        out = np.empty(X_all.shape[0])
+    # Bloque de una sola referencia: vistas (1, d) y (1, N), sin copias
+    ref = np.asarray(X_ref).ravel()
+    return _distancias_bloque(ref[None, :], X_all, metric, out[None, :])[0]
+
+
+def _distancias_bloque(refs: np.ndarray, X_all: np.ndarray, metric: str, out: np.ndarray) -> np.ndarray:
+    """
+    Distancias de cada fila de refs (m, d) a todas las filas de X_all, escritas
+    en out (float64, m x N). Las consultas usan m = 1 y el grafo de vecinos
+    bloques de filas, con la misma aritmética por par en ambos casos.
+    """
+    if metric not in ("euclidean", "cosine"):
         raise ValueError(f"Métrica no soportada: {metric}")
 
-    return distances
+    if SIMSIMD_AVAILABLE and X_all.dtype in (np.float32, np.float64):
+        # Resta, producto y suma en registros, sin matrices temporales (N, d).
+        # Ambos operandos deben ser contiguos y del mismo tipo.
+        X_all_c = np.ascontiguousarray(X_all)
+        refs_c = np.ascontiguousarray(refs, dtype=X_all_c.dtype)
+        if metric == "euclidean":
+            d2 = np.asarray(simsimd.cdist(refs_c, X_all_c, metric="sqeuclidean"))
+            return np.sqrt(d2, out=out)
+        out[...] = np.asarray(simsimd.cdist(refs_c, X_all_c, metric="cosine"))
+        return out
+
+    if _distancias_numba is not None:
+        X_all_c = np.ascontiguousarray(X_all)
+        refs_c = np.ascontiguousarray(refs, dtype=X_all_c.dtype)
+        return _distancias_numba(refs_c, X_all_c, metric == "cosine", out)
+
+    # Sin SimSIMD ni numba: un solo producto en float64 (a·b) y las normas al
+    # cuadrado de las filas sirven para ambas métricas, sin restas (N, d)
+    X_all_64 = np.asarray(X_all, dtype=np.float64)
+    normas_sq = np.einsum("ij,ij->i", X_all_64, X_all_64)
+    refs = refs.astype(np.float64, copy=False)
+    normas_ref_sq = np.einsum("ij,ij->i", refs, refs)[:, None]
+    np.matmul(refs, X_all_64.T, out=out)
+
+    if metric == "euclidean":
+        # ||a||² + ||b||² - 2·a·b; se recorta en 0 el redondeo antes de la raíz
+        out *= -2.0
+        out += normas_sq
+        out += normas_ref_sq
+        np.maximum(out, 0.0, out=out)
+        return np.sqrt(out, out=out)
+
+    # Distancia coseno = 1 - a·b / (||a||·||b||). Igual que cosine_similarity:
+    # un vector nulo tiene similitud 0
+    denominador = np.sqrt(normas_sq * normas_ref_sq)
+    np.divide(out, denominador, out=out, where=denominador > 0)
+    out[denominador <= 0] = 0.0
+    return np.subtract(1.0, out, out=out)
+
+
+def _k_mas_cercanos(distances: np.ndarray, k: int) -> np.ndarray:
+    """
+    Índices de las k distancias menores, en orden ascendente: argpartition
+    selecciona en O(N) y solo se ordenan los k candidatos.
+    """
+    n = distances.shape[0]
+    candidatos = np.argpartition(distances, k - 1)[:k] if k < n else np.arange(n)
+    return candidatos[np.argsort(distances[candidatos])]
+
+
+def _grafo_vecinos(X_all: np.ndarray, metric: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Grafo de vecinos precalculado: para cada muestra, los índices y distancias
+    de sus VECINOS_GRAFO más cercanos (incluida ella misma), en orden. Las
+    distancias se calculan por bloques de BLOQUE_GRAFO filas con la misma
+    aritmética por par que las consultas, así que los resultados coinciden.
+    """
+    n = X_all.shape[0]
+    m = min(VECINOS_GRAFO, n)
+    grafo_idx = np.empty((n, m), dtype=np.intp)
+    grafo_dist = np.empty((n, m))
+    buf = np.empty((min(BLOQUE_GRAFO, n), n))
+    for inicio in range(0, n, BLOQUE_GRAFO):
+        fin = min(inicio + BLOQUE_GRAFO, n)
+        distancias = _distancias_bloque(X_all[inicio:fin], X_all, metric, buf[:fin - inicio])
+        # Igual que _k_mas_cercanos, fila a fila
+        if m < n:
+            vecinos = np.argpartition(distancias, m - 1, axis=1)[:, :m]
+        else:
+            vecinos = np.broadcast_to(np.arange(n), distancias.shape)
+        dist_vecinos = np.take_along_axis(distancias, vecinos, axis=1)
+        orden = np.argsort(dist_vecinos, axis=1)
+        grafo_idx[inicio:fin] = np.take_along_axis(vecinos, orden, axis=1)
+        grafo_dist[inicio:fin] = np.take_along_axis(dist_vecinos, orden, axis=1)
+    return grafo_idx, grafo_dist
+
+
+# Tamaño de las cachés LRU de la sesión (distancias para visualización e
+# interpretaciones), que se invalidan juntas al cambiar version_analisis
+DISTANCIAS_CACHE_MAX = 16
+
+
+def _cache_lru(cache: Dict[tuple, Any], clave: tuple, calcular) -> Any:
+    """Valor de clave en cache, calculándolo si falta; descarta el usado hace más tiempo"""
+    valor = cache.pop(clave, None)
+    if valor is None:
+        valor = calcular()
+        if len(cache) >= DISTANCIAS_CACHE_MAX:
+            del cache[next(iter(cache))]
+    # Reinsertar al final: el orden del dict es el orden de uso
+    cache[clave] = valor
+    return valor
 
 
 def buscar_similares(
@@ -114,64 +319,83 @@ def buscar_similares(
     else:
         raise ValueError("Debes proporcionar sample_index o sample_values")
 
-    # Calcular distancias
-    distances = calcular_distancias(X_ref, X_all, metric)
-
-    # Obtener índices ordenados por distancia (excluyendo la propia muestra si aplica)
-    sorted_indices = np.argsort(distances)
+    # Candidatos: los k más cercanos, uno más si hay que descartar la propia muestra
+    k_eff = min(k + (1 if sample_index is not None else 0), n_samples)
+    if sample_index is not None and n_samples <= UMBRAL_GRAFO and k_eff <= VECINOS_GRAFO:
+        # Muestra interna en un dataset pequeño: leer del grafo de vecinos
+        grafo_idx, grafo_dist = _derivado_cacheado(
+            session, f"grafo_{metric}", space, X_all,
+            lambda X: _grafo_vecinos(X, metric)
+        )
+        candidatos = grafo_idx[sample_index, :k_eff]
+        dist_candidatos = grafo_dist[sample_index, :k_eff]
+    elif metric == "euclidean" and n_samples >= UMBRAL_KDTREE and X_all.shape[1] <= DIM_MAX_KDTREE:
+        # Dataset grande de pocas dimensiones: consulta O(log N) en el árbol KD
+        arbol = _derivado_cacheado(session, "kdtree", space, X_all, cKDTree)
+        dist_candidatos, candidatos = arbol.query(X_ref, k=k_eff)
+        candidatos = np.atleast_1d(candidatos)
+        dist_candidatos = np.atleast_1d(dist_candidatos)
+    else:
+        distances = calcular_distancias(
+            X_ref, X_all, metric, out=_buffer_distancias(session, n_samples)
+        )
+        candidatos = _k_mas_cercanos(distances, k_eff)
+        dist_candidatos = distances[candidatos]
 
     # Filtrar la propia muestra si es de referencia interna
     if sample_index is not None:
-        sorted_indices = sorted_indices[sorted_indices != sample_index]
+        no_propia = candidatos != sample_index
+        candidatos = candidatos[no_propia]
+        dist_candidatos = dist_candidatos[no_propia]
 
     # Tomar los k más cercanos
-    top_k_indices = sorted_indices[:k]
-
-    # Construir información de vecinos
-    vecinos = []
-    for idx in top_k_indices:
-        dist = float(distances[idx])
-
-        # Calcular similitud (inverso de distancia normalizado)
-        if metric == "euclidean":
-            # Similitud basada en distancia euclidiana
-            sim = 1 / (1 + dist)
-        else:
-            # Para coseno, similitud = 1 - distancia
-            sim = 1 - dist
-
-        # Obtener feedstock y concentration si están disponibles
-        feedstock_code = None
-        feedstock_name = None
-        concentration_code = None
-        concentration_name = None
+    top_k_indices = candidatos[:k]
 
-        if session.feedstock is not None:
-            feedstock_code = int(session.feedstock[idx])
-            feedstock_name = FEEDSTOCK_LABELS.get(feedstock_code, f"Tipo {feedstock_code}")
-
-        if session.concentration is not None:
-            concentration_code = int(session.concentration[idx])
-            concentration_name = CONCENTRATION_LABELS.get(concentration_code, f"Nivel {concentration_code}")
-
-        # Obtener coordenadas PCA para visualización
-        pc1, pc2 = None, None
-        if session.pca_scores is not None:
-            pc1 = float(session.pca_scores[idx, 0])
-            if session.pca_scores.shape[1] > 1:
-                pc2 = float(session.pca_scores[idx, 1])
+    # Construir información de vecinos: columnas extraídas de una vez con
+    # indexado vectorizado y tolist(), unidas en dicts con un solo zip
+    indices = top_k_indices.tolist()
+    n_vecinos = len(indices)
+    dists = dist_candidatos[:k].tolist()
 
-        vecinos.append({
-            "indice": int(idx),
+    # Similitud: inverso de distancia normalizado (euclidiana) o 1 - distancia (coseno)
+    if metric == "euclidean":
+        sims = [1 / (1 + d) for d in dists]
+    else:
+        sims = [1 - d for d in dists]
+
+    # Feedstock y concentration si están disponibles
+    feedstock_codes = feedstock_names = concentration_codes = concentration_names = [None] * n_vecinos
+    if session.feedstock is not None:
+        feedstock_codes = session.feedstock[top_k_indices].tolist()
+        feedstock_names = [FEEDSTOCK_LABELS.get(c, f"Tipo {c}") for c in feedstock_codes]
+    if session.concentration is not None:
+        concentration_codes = session.concentration[top_k_indices].tolist()
+        concentration_names = [CONCENTRATION_LABELS.get(c, f"Nivel {c}") for c in concentration_codes]
+
+    # Coordenadas PCA para visualización
+    pc1s = pc2s = [None] * n_vecinos
+    if session.pca_scores is not None:
+        pc1s = session.pca_scores[top_k_indices, 0].tolist()
+        if session.pca_scores.shape[1] > 1:
+            pc2s = session.pca_scores[top_k_indices, 1].tolist()
+
+    vecinos = [
+        {
+            "indice": idx,
             "distancia": dist,
-            "similitud": float(sim),
-            "feedstock": feedstock_name,
-            "feedstock_codigo": feedstock_code,
-            "concentration": concentration_name,
-            "concentration_codigo": concentration_code,
+            "similitud": sim,
+            "feedstock": fs_name,
+            "feedstock_codigo": fs_code,
+            "concentration": conc_name,
+            "concentration_codigo": conc_code,
             "pc1": pc1,
             "pc2": pc2
-        })
+        }
+        for idx, dist, sim, fs_name, fs_code, conc_name, conc_code, pc1, pc2 in zip(
+            indices, dists, sims, feedstock_names, feedstock_codes,
+            concentration_names, concentration_codes, pc1s, pc2s
+        )
+    ]
 
     # Construir información de muestra de referencia
     ref_feedstock = None
@@ -196,40 +420,16 @@ def buscar_similares(
         "pc2": ref_pc2
     }
 
-    # Generar interpretación
-    if len(vecinos) > 0:
-        # Analizar feedstocks de los vecinos
-        feedstocks_vecinos = [v["feedstock"] for v in vecinos if v["feedstock"]]
-        if feedstocks_vecinos:
-            from collections import Counter
-            feedstock_counts = Counter(feedstocks_vecinos)
-            mas_comun = feedstock_counts.most_common(1)[0]
-            pct = (mas_comun[1] / len(feedstocks_vecinos)) * 100
-
-            if pct >= 80:
-                interpretacion = (
-                    f"Las {k} muestras más similares son predominantemente de {mas_comun[0]} "
-                    f"({pct:.0f}%). Esto sugiere una fuerte asociación del perfil químico "
-                    f"con esta materia prima."
-                )
-            elif pct >= 50:
-                interpretacion = (
-                    f"La mayoría de las muestras similares ({pct:.0f}%) corresponden a {mas_comun[0]}, "
-                    f"pero hay variabilidad. El perfil químico tiene características mixtas."
-                )
-            else:
-                interpretacion = (
-                    f"Las muestras similares provienen de diversas fuentes. "
-                    f"El perfil químico no está claramente asociado a una sola materia prima."
-                )
-        else:
-            dist_promedio = np.mean([v["distancia"] for v in vecinos])
-            interpretacion = (
-                f"Se encontraron {k} muestras similares con distancia promedio de {dist_promedio:.3f}. "
-                f"Cuanto menor la distancia, mayor la similitud química."
-            )
+    # Generar interpretación: solo depende de los vecinos, así que para muestras
+    # internas se reutiliza mientras no cambie el análisis
+    if sample_index is not None:
+        clave = (session.version_analisis, sample_index, space, metric, k)
+        interpretacion = _cache_lru(
+            session.interpretaciones_cache, clave,
+            lambda: _interpretar_vecinos(session, top_k_indices, vecinos, k)
+        )
     else:
-        interpretacion = "No se encontraron muestras similares."
+        interpretacion = _interpretar_vecinos(session, top_k_indices, vecinos, k)
 
     return {
         "muestra_referencia": muestra_ref,
@@ -238,6 +438,47 @@ def buscar_similares(
     }
 
 
+def _interpretar_vecinos(session, top_k_indices: np.ndarray, vecinos: List[Dict[str, Any]], k: int) -> str:
+    """Texto de interpretación de una búsqueda a partir de sus vecinos."""
+    if len(vecinos) == 0:
+        return "No se encontraron muestras similares."
+
+    # Analizar feedstocks de los vecinos: voto mayoritario con bincount sobre
+    # los códigos (desplazados por el mínimo); en empate gana el que aparece
+    # primero entre los vecinos, como en Counter.most_common
+    if session.feedstock is not None:
+        codigos = session.feedstock[top_k_indices].astype(np.intp)
+        codigos -= codigos.min()
+        conteos = np.bincount(codigos)
+        maximo = conteos.max()
+        posicion = int(np.argmax(conteos[codigos] == maximo))
+        mas_comun = (vecinos[posicion]["feedstock"], int(maximo))
+        pct = (mas_comun[1] / len(codigos)) * 100
+
+        if pct >= 80:
+            return (
+                f"Las {k} muestras más similares son predominantemente de {mas_comun[0]} "
+                f"({pct:.0f}%). Esto sugiere una fuerte asociación del perfil químico "
+                f"con esta materia prima."
+            )
+        elif pct >= 50:
+            return (
+                f"La mayoría de las muestras similares ({pct:.0f}%) corresponden a {mas_comun[0]}, "
+                f"pero hay variabilidad. El perfil químico tiene características mixtas."
+            )
+        else:
+            return (
+                f"Las muestras similares provienen de diversas fuentes. "
+                f"El perfil químico no está claramente asociado a una sola materia prima."
+            )
+    else:
+        dist_promedio = np.mean([v["distancia"] for v in vecinos])
+        return (
+            f"Se encontraron {k} muestras similares con distancia promedio de {dist_promedio:.3f}. "
+            f"Cuanto menor la distancia, mayor la similitud química."
+        )
+
+
 def obtener_todas_distancias(
     session_id: str,
     sample_index: int,
@@ -247,6 +488,9 @@ def obtener_todas_distancias(
     """
     Obtiene las distancias de una muestra a todas las demás (útil para visualización).
 
+    El resultado se reutiliza mientras no cambie el análisis de la sesión
+    (version_analisis), ya que la UI lo pide repetidamente para la misma muestra.
+
     Returns:
         Diccionario con índices, distancias y coordenadas PCA
     """
@@ -254,6 +498,15 @@ def obtener_todas_distancias(
     if not session:
         raise ValueError("Sesión no encontrada")
 
+    clave = (session.version_analisis, sample_index, space, metric)
+    return _cache_lru(
+        session.distancias_visualizacion_cache, clave,
+        lambda: _calcular_todas_distancias(session, sample_index, space, metric)
+    )
+
+
+def _calcular_todas_distancias(session, sample_index: int, space: str, metric: str) -> Dict[str, Any]:
+    """Cuerpo de obtener_todas_distancias (sin caché)."""
     # Obtener matriz de datos
     if space == "pca":
         if session.pca_scores is None:
@@ -265,29 +518,35 @@ def obtener_todas_distancias(
         X_all = session.X_procesado
 
     X_ref = X_all[sample_index]
-    distances = calcular_distancias(X_ref, X_all, metric)
-
-    # Preparar datos para visualización
-    puntos = []
-    for i in range(len(distances)):
-        punto = {
-            "indice": i,
-            "distancia": float(distances[i]),
-            "es_referencia": i == sample_index
-        }
+    distances = calcular_distancias(
+        X_ref, X_all, metric, out=_buffer_distancias(session, X_all.shape[0])
+    )
+
+    # Preparar datos para visualización: una columna por campo (conversión
+    # en bloque con tolist) y un dict por punto con un solo zip
+    n_puntos = len(distances)
+    es_referencia = [False] * n_puntos
+    if 0 <= sample_index < n_puntos:
+        es_referencia[sample_index] = True
+    columnas = {
+        "indice": range(n_puntos),
+        "distancia": distances.tolist(),
+        "es_referencia": es_referencia
+    }
 
-        if session.pca_scores is not None:
-            punto["pc1"] = float(session.pca_scores[i, 0])
-            if session.pca_scores.shape[1] > 1:
-                punto["pc2"] = float(session.pca_scores[i, 1])
+    if session.pca_scores is not None:
+        columnas["pc1"] = session.pca_scores[:, 0].tolist()
+        if session.pca_scores.shape[1] > 1:
+            columnas["pc2"] = session.pca_scores[:, 1].tolist()
 
-        if session.feedstock is not None:
-            punto["feedstock"] = int(session.feedstock[i])
+    if session.feedstock is not None:
+        columnas["feedstock"] = session.feedstock.tolist()
 
-        if session.concentration is not None:
-            punto["concentration"] = int(session.concentration[i])
+    if session.concentration is not None:
+        columnas["concentration"] = session.concentration.tolist()
 
-        puntos.append(punto)
+    claves = tuple(columnas)
+    puntos = [dict(zip(claves, fila)) for fila in zip(*columnas.values())]
 
     return {
         "sample_index": sample_index,
@@ -4,12 +4,21 @@ En producción, esto podría ser Redis o una base de datos.
 """
 
 from typing import Dict, Any, Optional
+from pathlib import Path
+import atexit
+import os
+import tempfile
+import uuid
 import pandas as pd
 import numpy as np
 from dataclasses import dataclass, field
 
 
-@dataclass
+# Directorio donde se guardan las matrices preprocesadas (mapeadas en memoria)
+MATRICES_DIR = Path(os.getenv("CHEMOMETRICS_MATRICES_DIR", tempfile.gettempdir()))
+
+
+@dataclass(slots=True)
 class ClassifierData:
     """Datos de un clasificador entrenado"""
     modelo: Any = None
@@ -26,15 +35,16 @@ class ClassifierData:
     usar_pca: bool = False
 
 
-@dataclass
+@dataclass(slots=True)
 class SessionData:
-    """Datos almacenados para una sesión"""
+    """Datos almacenados para una sesión (con __slots__: solo admite los campos declarados)"""
     # Datos originales
     df_original: Optional[pd.DataFrame] = None
 
     # Datos preprocesados
     df_preprocesado: Optional[pd.DataFrame] = None
-    X_procesado: Optional[np.ndarray] = None
+    X_procesado: Optional[np.ndarray] = None  # float32, mapeado en memoria desde disco
+    X_procesado_path: Optional[str] = None
     columnas_numericas: list = field(default_factory=list)
     columnas_categoricas: list = field(default_factory=list)
     columnas_seleccionadas: list = field(default_factory=list)
@@ -44,6 +54,36 @@ class SessionData:
     pca_loadings: Optional[np.ndarray] = None
     pca_varianza: Optional[np.ndarray] = None
     pca_componentes_nombres: list = field(default_factory=list)
+    # Derivados de pca_varianza para reportes: % por componente, % acumulado y
+    # número de PCs que alcanzan el 80%
+    pca_varianza_pct: Optional[np.ndarray] = None
+    pca_var_acumulada: Optional[np.ndarray] = None
+    pcs_80: Optional[int] = None
+    pca_X_origen: Optional[np.ndarray] = None  # X_procesado sobre el que se ajustó el PCA
+
+    # Caché de diagnósticos PCA (T², Q): (arrays de entrada, resultado)
+    diagnosticos_cache: Optional[tuple] = None
+
+    # Caché del resumen del reporte: (version_analisis, resumen)
+    resumen_cache: Optional[tuple] = None
+
+    # Caché de embeddings UMAP/t-SNE: (metodo, parámetros, forma y buffer de X) -> coords
+    embeddings_cache: Dict[tuple, np.ndarray] = field(default_factory=dict)
+
+    # Derivados para búsquedas de similitud (grafo de vecinos por métrica,
+    # árbol KD):
+    # (tipo, espacio) -> (array origen, derivado)
+    distancias_cache: Dict[tuple, tuple] = field(default_factory=dict)
+    # Buffer reutilizable para las N distancias de cada consulta de similitud.
+    # El buffer es C-contiguo y alineado a 64 bytes
+    # (X_procesado también, al estar mapeado desde el inicio de un archivo)
+    distancias_buf: Optional[np.ndarray] = None
+    # LRU de distancias para visualización (vive y muere con la sesión):
+    # (version_analisis, sample_index, space, metric) -> resultado
+    distancias_visualizacion_cache: Dict[tuple, Dict[str, Any]] = field(default_factory=dict)
+    # LRU de interpretaciones de búsquedas con muestra interna:
+    # (version_analisis, sample_index, space, metric, k) -> texto
+    interpretaciones_cache: Dict[tuple, str] = field(default_factory=dict)
 
     # Resultados de Clustering
     cluster_labels: Optional[np.ndarray] = None
@@ -57,6 +97,10 @@ class SessionData:
     classifier_feedstock: Optional[ClassifierData] = None
     classifier_concentration: Optional[ClassifierData] = None
 
+    # Se incrementa en cada cambio del análisis (datos, PCA, clustering,
+    # clasificadores); invalida cachés derivados como el resumen del reporte
+    version_analisis: int = 0
+
 
 class DataStore:
     """Almacén de datos en memoria para todas las sesiones"""
@@ -64,6 +108,9 @@ class DataStore:
     def __init__(self):
         self._sessions: Dict[str, SessionData] = {}
         self._counter = 0
+        # Archivos .npy que no se pudieron borrar (p. ej. en Windows, mientras
+        # siguen mapeados); se reintenta en cada liberación y al terminar
+        self._archivos_pendientes: list = []
 
     def crear_sesion(self) -> str:
         """Crea una nueva sesión y retorna su ID"""
@@ -83,15 +130,65 @@ class DataStore:
     def eliminar_sesion(self, session_id: str) -> bool:
         """Elimina una sesión"""
         if session_id in self._sessions:
+            self.liberar_matriz_procesada(self._sessions[session_id])
             del self._sessions[session_id]
             return True
         return False
 
     def limpiar_todas(self):
         """Elimina todas las sesiones (útil para testing)"""
+        for session in self._sessions.values():
+            self.liberar_matriz_procesada(session)
         self._sessions.clear()
+        self._borrar_archivos_pendientes()
         self._counter = 0
 
+    def guardar_matriz_procesada(self, session_id: str, X: np.ndarray) -> np.ndarray:
+        """
+        Guarda la matriz preprocesada como .npy float32 y la asigna a la sesión
+        como un memmap de solo lectura. Así las operaciones posteriores (PCA,
+        diagnósticos, similitud) leen las mismas páginas sin duplicar la matriz
+        en el heap de cada petición o proceso.
+
+        Returns:
+            La matriz mapeada en memoria
+        """
+        session = self._sessions[session_id]
+        self.liberar_matriz_procesada(session)
+
+        # Nombre único: en Windows no se puede sobrescribir un archivo aún mapeado
+        path = MATRICES_DIR / f"{session_id}_{uuid.uuid4().hex}_X.npy"
+        np.save(path, np.ascontiguousarray(X, dtype=np.float32))
+
+        session.X_procesado = np.load(path, mmap_mode='r')
+        session.X_procesado_path = str(path)
+        return session.X_procesado
+
+    def liberar_matriz_procesada(self, session: SessionData):
+        """Quita la matriz preprocesada de la sesión y borra su archivo"""
+        session.X_procesado = None
+        if session.X_procesado_path is not None:
+            self._archivos_pendientes.append(session.X_procesado_path)
+            session.X_procesado_path = None
+        self._borrar_archivos_pendientes()
+
+    def _borrar_archivos_pendientes(self):
+        """Borra los archivos pendientes; conserva los que aún no se pueden borrar"""
+        pendientes = []
+        for path in self._archivos_pendientes:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # En Windows no se puede borrar un archivo que otra referencia
+                # aún mantiene mapeado; se reintenta en la próxima liberación
+                pendientes.append(path)
+        self._archivos_pendientes = pendientes
+
 
 # Instancia global del store
 store = DataStore()
+
+# Borrar las matrices en disco al terminar el proceso
+atexit.register(store.limpiar_todas)
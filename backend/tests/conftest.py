@@ -0,0 +1,64 @@
+"""
+Fixtures compartidas por las pruebas de la API.
+Ejecutar desde backend/ (requiere pytest y httpx): python -m pytest tests
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.main import app  # noqa: E402
+from app.services.store import store  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    """Cliente HTTP de prueba sobre la aplicación FastAPI"""
+    return TestClient(app)
+
+
+def _datos_sinteticos(n_muestras: int = 60, n_variables: int = 8, seed: int = 0) -> pd.DataFrame:
+    """
+    Datos de rango bajo: 3 factores latentes más ruido pequeño, de modo que
+    unos pocos componentes explican casi toda la varianza.
+    """
+    rng = np.random.default_rng(seed)
+    factores = rng.normal(size=(n_muestras, 3)) * np.array([3.0, 2.0, 1.5])
+    cargas = rng.normal(size=(3, n_variables))
+    X = factores @ cargas + 0.05 * rng.normal(size=(n_muestras, n_variables))
+    return pd.DataFrame(X, columns=[f"var_{i}" for i in range(n_variables)])
+
+
+@pytest.fixture
+def session_id(client):
+    """Sesión con datos sintéticos cargados y preprocesados (estandarizados)"""
+    df = _datos_sinteticos()
+    r = client.post(
+        "/api/data/upload",
+        files={"file": ("sinteticos.csv", df.to_csv(index=False).encode())}
+    )
+    assert r.status_code == 200, r.text
+    sid = r.json()["session_id"]
+
+    r = client.post(
+        "/api/data/preprocesar",
+        json={"session_id": sid, "columnas_seleccionadas": list(df.columns)}
+    )
+    assert r.status_code == 200, r.text
+
+    yield sid
+    store.eliminar_sesion(sid)
+
+
+@pytest.fixture
+def session_pca(client, session_id):
+    """Sesión con PCA de 4 componentes ya calculado"""
+    r = client.post("/api/pca/calcular", json={"session_id": session_id, "n_componentes": 4})
+    assert r.status_code == 200, r.text
+    return session_id
@@ -0,0 +1,109 @@
+"""
+Pruebas del contrato de la API de PCA (/api/pca)
+"""
+
+import pytest
+
+
+def _filas_a_columnas(filas, claves):
+    return {clave: [fila[clave] for fila in filas] for clave in claves}
+
+
+@pytest.mark.parametrize("endpoint", ["calcular", "resultados"])
+def test_formato_columnas_equivale_a_filas(client, session_id, endpoint):
+    respuestas = {}
+    for formato in ("filas", "columnas"):
+        if endpoint == "calcular":
+            r = client.post(
+                "/api/pca/calcular",
+                json={"session_id": session_id, "n_componentes": 4, "formato": formato}
+            )
+        else:
+            client.post("/api/pca/calcular", json={"session_id": session_id, "n_componentes": 4})
+            r = client.get(f"/api/pca/resultados/{session_id}", params={"formato": formato})
+        assert r.status_code == 200, r.text
+        respuestas[formato] = r.json()
+
+    filas, columnas = respuestas["filas"], respuestas["columnas"]
+    assert filas["formato"] == "filas"
+    assert columnas["formato"] == "columnas"
+
+    componentes = [v["componente"] for v in filas["varianza_explicada"]]
+    assert len(filas["scores"]) == len(filas["nombres_muestras"])
+    assert columnas["scores"] == _filas_a_columnas(filas["scores"], componentes)
+    assert columnas["loadings"] == _filas_a_columnas(filas["loadings"], ["variable", *componentes])
+    assert columnas["loadings"]["variable"] == filas["nombres_variables"]
+
+
+def test_formato_invalido_devuelve_400(client, session_id):
+    r = client.post(
+        "/api/pca/calcular",
+        json={"session_id": session_id, "n_componentes": 4, "formato": "tabla"}
+    )
+    assert r.status_code == 400
+
+
+def test_n_componentes_por_defecto_estima_95_por_ciento(client, session_id):
+    r = client.post("/api/pca/calcular", json={"session_id": session_id})
+    assert r.status_code == 200, r.text
+    datos = r.json()
+
+    acumulada = [v["varianza_acumulada"] for v in datos["varianza_explicada"]]
+    n = datos["n_componentes"]
+    assert n == len(acumulada)
+    # Al menos 3 PCs (proyección 3D), sin llegar al rango completo
+    assert 3 <= n < len(datos["nombres_variables"])
+    # El mínimo que alcanza ~95%: con un componente menos no se llegaría
+    assert acumulada[-1] >= 95.0 - 1e-3
+    if n > 3:
+        assert acumulada[-2] < 95.0
+
+
+@pytest.mark.parametrize("tipo_metrica", ["T2", "Q"])
+def test_contribuciones_batch_equivale_a_llamadas_individuales(client, session_pca, tipo_metrica):
+    indices = [0, 7, 3, 7]
+    r = client.post(
+        "/api/pca/contribuciones-batch",
+        json={"session_id": session_pca, "sample_indices": indices, "tipo_metrica": tipo_metrica}
+    )
+    assert r.status_code == 200, r.text
+    lote = r.json()
+    assert lote["tipo_metrica"] == tipo_metrica
+    assert len(lote["resultados"]) == len(indices)
+
+    for idx, resultado in zip(indices, lote["resultados"]):
+        r = client.post(
+            "/api/pca/contribuciones",
+            json={"session_id": session_pca, "sample_index": idx, "tipo_metrica": tipo_metrica}
+        )
+        assert r.status_code == 200, r.text
+        individual = r.json()
+        assert resultado == {clave: individual[clave] for clave in resultado}
+
+
+@pytest.mark.parametrize("indice", [-1, 60])
+def test_contribuciones_batch_indice_fuera_de_rango_devuelve_400(client, session_pca, indice):
+    r = client.post(
+        "/api/pca/contribuciones-batch",
+        json={"session_id": session_pca, "sample_indices": [0, indice], "tipo_metrica": "T2"}
+    )
+    assert r.status_code == 400
+
+
+def test_optimizacion_sin_errores_omite_campos_de_error(client, session_id):
+    con_errores = client.get(f"/api/pca/optimizacion/{session_id}")
+    sin_errores = client.get(
+        f"/api/pca/optimizacion/{session_id}", params={"incluir_errores": False}
+    )
+    assert con_errores.status_code == 200, con_errores.text
+    assert sin_errores.status_code == 200, sin_errores.text
+    con_errores, sin_errores = con_errores.json(), sin_errores.json()
+
+    campos_error = {"error_reconstruccion", "error_normalizado"}
+    assert all(campos_error <= set(r) for r in con_errores["resultados"])
+    assert not any(campos_error & set(r) for r in sin_errores["resultados"])
+
+    # La curva de varianza es la misma con o sin errores
+    assert [
+        {k: v for k, v in r.items() if k not in campos_error} for r in con_errores["resultados"]
+    ] == sin_errores["resultados"]
@@ -5,6 +5,8 @@ import {
   PCADiagnosticsResponse,
   PCAContributionsRequest,
   PCAContributionsResponse,
+  PCAContributionsBatchRequest,
+  PCAContributionsBatchResponse,
   PCAOptimizationResponse,
   PCA3DResponse,
   ChemicalMapRequest,
@@ -43,6 +45,16 @@ export async function getPCAContributions(request: PCAContributionsRequest): Pro
   return response.data;
 }
 
+/**
+ * Obtiene contribuciones de variables para varias muestras en una sola petición
+ */
+export async function getPCAContributionsBatch(
+  request: PCAContributionsBatchRequest
+): Promise<PCAContributionsBatchResponse> {
+  const response = await apiClient.post<PCAContributionsBatchResponse>('/pca/contribuciones-batch', request);
+  return response.data;
+}
+
 /**
  * Obtiene análisis de optimización del número de PCs
  */
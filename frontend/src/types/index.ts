@@ -100,6 +100,7 @@ export interface LoadingRow {
 export interface PCARequest {
   session_id: string;
   n_componentes: number | null;
+  formato?: 'filas' | 'columnas';  // 'filas' por defecto (ScoreRow[] / LoadingRow[])
 }
 
 export interface PCAResults {
@@ -567,6 +568,27 @@ export interface PCAContributionsResponse {
   interpretacion: string;
 }
 
+export interface PCAContributionsBatchRequest {
+  session_id: string;
+  sample_indices: number[];
+  tipo_metrica: 'T2' | 'Q';
+}
+
+export interface SampleContributions {
+  muestra: ContributionSampleInfo;
+  tipo_metrica: string;
+  contribuciones: VariableContribution[];
+  top_5_variables: string[];
+  interpretacion: string;
+}
+
+export interface PCAContributionsBatchResponse {
+  exito: boolean;
+  mensaje: string;
+  tipo_metrica: string;
+  resultados: SampleContributions[];
+}
+
 // ============================================================================
 // TIPOS DE AUTO-OPTIMIZACIÓN DE PCs
 // ============================================================================
@@ -575,8 +597,9 @@ export interface PCOptimizationResult {
   k: number;
   varianza_individual: number;
   varianza_acumulada: number;
-  error_reconstruccion: number;
-  error_normalizado: number;
+  // Ausentes si se pidió la optimización con incluir_errores=false
+  error_reconstruccion?: number;
+  error_normalizado?: number;
 }
 
 export interface OptimizationCriteria {